@@ -0,0 +1,92 @@
+"""
+Compare the streaming CGI result parser with ElementTree parsing.
+
+Run from the repository root: python benchmarks/parse_response.py
+"""
+
+import os
+import sys
+import timeit
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+from urllib.parse import quote, unquote
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from libpyfoscam.response import CGIResultParser, parse_cgi_result  # noqa: E402
+
+
+def build_response(params):
+    lines = ["<CGI_Result>", "<result>0</result>"]
+    for name, value in params.items():
+        lines.append(f"<{name}>{value}</{name}>")
+    lines.append("</CGI_Result>")
+    return "\n".join(lines).encode()
+
+
+def parse_element_tree(data):
+    root = ET.fromstring(data)
+    code = None
+    params = OrderedDict()
+    for child in root.iter():
+        if child.tag == "result":
+            code = int(child.text)
+        elif child.tag != "CGI_Result":
+            params[child.tag] = unquote(child.text) if child.text is not None else None
+    return code, params
+
+
+def parse_chunks(chunks):
+    parser = CGIResultParser()
+    for chunk in chunks:
+        parser.feed(chunk)
+    return parser.close()
+
+
+RESPONSES = {
+    "getDevState": build_response(
+        {f"state{i}": i % 3 for i in range(24)}
+    ),
+    "getLog": build_response(
+        dict(
+            [("totalCnt", 120), ("curCnt", 10)]
+            + [
+                (f"log{i}", quote(f"{1600000000 + i}+admin+192.168.1.{i}+4"))
+                for i in range(10)
+            ]
+        )
+    ),
+    "getWifiList": build_response(
+        dict(
+            [("totalCnt", 23), ("curCnt", 10)]
+            + [
+                (f"ap{i}", quote(f"network {i}+AA:BB:CC:DD:EE:{i:02X}+{40 + i}+1+3"))
+                for i in range(10)
+            ]
+        )
+    ),
+    "getProductAllInfo": build_response(
+        {f"product{name}": i for i, name in enumerate("ABCDEFGHIJKLMNOPQRSTUVWXYZ" * 3)}
+    ),
+}
+
+
+def main(number=20000):
+    print(f"{'command':<20}{'ElementTree':>14}{'streaming':>14}{'chunked':>14}")
+    for cmd, data in RESPONSES.items():
+        assert parse_element_tree(data) == parse_cgi_result(data)
+        chunks = [data[i : i + 512] for i in range(0, len(data), 512)]
+        assert parse_chunks(chunks) == parse_cgi_result(data)
+        results = [
+            timeit.timeit(lambda: parse(arg), number=number) / number * 1e6
+            for parse, arg in (
+                (parse_element_tree, data),
+                (parse_cgi_result, data),
+                (parse_chunks, chunks),
+            )
+        ]
+        print(f"{cmd:<20}" + "".join(f"{us:>11.1f} us" for us in results))
+
+
+if __name__ == "__main__":
+    main()
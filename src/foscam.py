@@ -1,5 +1,5 @@
 from libconfig.config import read_config
-from libpyfoscam import FoscamCamera
+from libpyfoscam import FoscamFleet
 from os import path
 from time import sleep
 
@@ -11,17 +11,13 @@ def main():
     try:
         if path.exists(f"{CAMERAS}"):
             data = read_config(f"{CAMERAS}")
-            cameras = {}
-            for key, values in data.items():
-                cameras[key] = FoscamCamera(
-                    values["host"], values["port"], values["login"], values["password"]
-                )
+            fleet = FoscamFleet.from_config(data)
         else:
             print(f"{CAMERAS} does not exist.")
     except FileNotFoundError:
         print(f"Could not read {file}.")
 
-    print(cameras["foscam1"].get_pppoe_config())
+    print(fleet["foscam1"].get_pppoe_config())
 
 
 if __name__ == "__main__":
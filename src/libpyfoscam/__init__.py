@@ -1 +1,3 @@
 from libpyfoscam.foscam import FoscamCamera
+from libpyfoscam.aio import AsyncFoscamCamera
+from libpyfoscam.fleet import FoscamFleet
@@ -0,0 +1,445 @@
+"""
+An asyncio client for Foscam FI9936P cameras
+"""
+
+import asyncio
+from collections import deque
+from time import monotonic
+
+from libpyfoscam.connection import ConnectionPool, get_ssl_context, ssl_enabled
+from libpyfoscam.foscam import (
+    ERROR_FOSCAM_TIMEOUT,
+    ERROR_FOSCAM_UNAVAILABLE,
+    FOSCAM_SUCCESS,
+    FoscamCamera,
+    FoscamError,
+    _config_update,
+    _copy_params,
+)
+from libpyfoscam.log import decode_log_page
+from libpyfoscam.snapshot import write_into
+from libpyfoscam.wifi import decode_wifi_page
+
+JPEG_SOI = b"\xff\xd8"
+
+
+class _Connection(object):
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.released = monotonic()
+
+    def close(self):
+        try:
+            self.writer.close()
+        except RuntimeError:
+            # Its event loop is closed, the transport closes the socket.
+            pass
+
+
+class AsyncConnectionPool(object):
+    """
+    A pool of persistent HTTP/1.1 connections to one camera for asyncio.
+
+    At most ``size`` requests are in flight at once, each on its own
+    connection, so memory per camera stays bounded however many commands
+    are awaited. Idle connections are reused, dropped after ``idle_timeout``
+    seconds, and a request failing on a reused connection is retried once.
+
+    The pool is bound to the event loop running its requests. Once that
+    loop stopped, as at the end of asyncio.run, the next loop takes it
+    over with new connections; using it from two loops at once raises
+    RuntimeError.
+    """
+
+    def __init__(
+        self, host, port, ssl_context=None, size=2, idle_timeout=60, timeout=5
+    ):
+        self.host = host
+        self.port = port
+        self.ssl_context = ssl_context
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self._idle = []
+        self._slots = None
+        self._loop = None
+
+    def _bind(self):
+        """
+        Bind the pool to the running event loop.
+        """
+        loop = asyncio.get_running_loop()
+        if loop is self._loop:
+            return
+        if self._loop is not None and self._loop.is_running():
+            raise RuntimeError("AsyncConnectionPool is bound to another event loop")
+        # Connections and waiters of the previous loop cannot be used here.
+        self.close()
+        self._slots = asyncio.Semaphore(self.size)
+        self._loop = loop
+
+    async def _acquire(self):
+        now = monotonic()
+        while self._idle:
+            conn = self._idle.pop()
+            if now - conn.released <= self.idle_timeout:
+                return conn, True
+            conn.close()
+        # Like the sync client, do not wait for the OS connect timeout.
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(
+                self.host,
+                self.port,
+                ssl=self.ssl_context,
+                server_hostname=self.host if self.ssl_context else None,
+            ),
+            self.timeout,
+        )
+        return _Connection(reader, writer), False
+
+    def _release(self, conn):
+        conn.released = monotonic()
+        self._idle.append(conn)
+
+    async def _read_body(self, reader, headers):
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    return b"".join(chunks), False
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+        if "content-length" in headers:
+            return await reader.readexactly(int(headers["content-length"])), False
+        return await reader.read(), True
+
+    async def _exchange(self, conn, path):
+        conn.writer.write(
+            f"GET {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n\r\n".encode()
+        )
+        await conn.writer.drain()
+        status_line = await conn.reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Connection closed by camera")
+        version, status, *_ = status_line.decode("latin-1").split(None, 2)
+        headers = {}
+        while True:
+            line = await conn.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        body, will_close = await self._read_body(conn.reader, headers)
+        if version == "HTTP/1.0" or headers.get("connection", "").lower() == "close":
+            will_close = True
+        return int(status), body, will_close
+
+    async def request(self, path):
+        """
+        Send a GET request for ``path`` and return the response body.
+        Raises OSError or asyncio.TimeoutError on failure, RuntimeError if
+        the pool is in use by another event loop.
+        """
+        self._bind()
+        async with self._slots:
+            for attempt in range(2):
+                conn, reused = await self._acquire()
+                try:
+                    status, body, will_close = await asyncio.wait_for(
+                        self._exchange(conn, path), self.timeout
+                    )
+                except asyncio.TimeoutError:
+                    conn.close()
+                    raise
+                except (OSError, ValueError, asyncio.IncompleteReadError):
+                    conn.close()
+                    if reused and attempt == 0:
+                        continue
+                    raise
+                if will_close:
+                    conn.close()
+                else:
+                    self._release(conn)
+                if status != 200:
+                    raise OSError(f"HTTP {status}")
+                return body
+
+    def close(self):
+        """
+        Close all idle connections.
+        """
+        idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+class AsyncFoscamCamera(FoscamCamera):
+    """
+    An asyncio implementation for foscam FI9936P.
+
+    Every command method of FoscamCamera is available and returns a
+    coroutine, e.g. ``code, params = await camera.get_ip_info()``.
+    open_mjpeg_stream still reads the stream on a thread, over its own
+    connection, into a FrameRing that can be read from the event loop.
+    At most pool_size commands are in flight per camera, and identical
+    get commands in flight at the same time share one request.
+    A camera can be used by one event loop after the other, as by
+    successive asyncio.run calls, but not by two at once.
+    """
+
+    def __init__(
+        self,
+        host,
+        port,
+        usr,
+        pwd,
+        ssl=None,
+        verbose=False,
+        pool_size=2,
+        pool_idle_timeout=60,
+        ssl_cafile=None,
+        ssl_minimum_version=None,
+        coalesce_reads=True,
+        cache=None,
+        typed_results=False,
+    ):
+        super(AsyncFoscamCamera, self).__init__(
+            host,
+            port,
+            usr,
+            pwd,
+            ssl=ssl,
+            verbose=verbose,
+            pool_size=0,
+            coalesce_reads=coalesce_reads,
+            cache=cache,
+            typed_results=typed_results,
+        )
+        self._reads = {}
+        ssl_context = None
+        if self.ssl and ssl_enabled:
+            ssl_context = get_ssl_context(ssl_cafile, ssl_minimum_version)
+        self._pool = AsyncConnectionPool(
+            host,
+            port,
+            ssl_context=ssl_context,
+            size=pool_size,
+            idle_timeout=pool_idle_timeout,
+        )
+        # The MJPEG stream reader is a thread with a blocking connection.
+        self._stream_pool = ConnectionPool(host, port, ssl_context=ssl_context, size=0)
+
+    def _stream_connection(self):
+        return self._stream_pool.connect()
+
+    async def send_command(self, cmd, params=None, raw=False, into=None):
+        """
+        Send command to foscam camera
+        With into, a picture is copied into it instead of returned as bytes.
+        """
+        cmdpath = self._command_path(cmd, params)
+        if self.verbose:
+            scheme = "https" if self.ssl and ssl_enabled else "http"
+            print(f"Send Foscam command: {scheme}://{self.url}{cmdpath}")
+        try:
+            raw_string = ""
+            raw_string = await self._pool.request(cmdpath)
+            if into is None:
+                return self._parse_response(raw_string, raw)
+            if raw_string[:2] == JPEG_SOI:
+                return FOSCAM_SUCCESS, write_into(raw_string, into)
+            code, _ = self._parse_response(raw_string)
+            return code, None
+        except (BufferError, RuntimeError):
+            raise
+        except Exception:
+            if self.verbose:
+                print(f"Foscam exception: {raw_string}")
+            return ERROR_FOSCAM_UNAVAILABLE, None
+
+    def execute_command(
+        self, cmd, params=None, callback=None, raw=False, into=None, typed=True
+    ):
+        """
+        Return a coroutine executing a command with a parsed response.
+        With typed False, the response is a dict even with typed_results.
+        """
+
+        async def execute_with_callbacks():
+            self._written(cmd)
+            key = self._read_key(cmd, params, raw)
+            generation = None
+            if self.cache is not None and not raw:
+                response = self.cache.get(self.url, cmd, params)
+                if response is not None:
+                    code, result = response[0], _copy_params(response[1])
+                    result = self._typed(cmd, result, typed)
+                    if callback:
+                        callback(code, result)
+                    return code, result
+                generation = self.cache.generation(self.url)
+            if key is None:
+                code, result = await self.send_command(cmd, params, raw, into)
+            else:
+                task = self._reads.get(key)
+                if task is None:
+                    task = asyncio.ensure_future(self.send_command(cmd, params, raw))
+                    self._reads[key] = task
+                    task.add_done_callback(lambda task: self._reads.pop(key, None))
+                code, result = await asyncio.shield(task)
+                result = _copy_params(result)
+            if generation is not None:
+                response = _copy_params(result)
+                self.cache.update(self.url, cmd, params, code, response, generation)
+            result = self._typed(cmd, result, typed)
+            if callback:
+                callback(code, result)
+            return code, result
+
+        return execute_with_callbacks()
+
+    async def is_asleep(self, callback=None):
+        """
+        Wakup camera
+        """
+        ret, data = await self.execute_command("getAlexaState", callback=callback)
+
+        is_asleep = int(data["state"]) == 1 if ret == 0 else False
+
+        return ret, is_asleep
+
+    async def set_config_if_changed(self, get_cmd, set_cmd, changes):
+        """
+        Read a config group with get_cmd, apply changes and write it back
+        with set_cmd, unless every changed value is already set.
+        Return: (result, changed)
+        """
+        result, current_config = await self.execute_command(get_cmd, typed=False)
+        if result != FOSCAM_SUCCESS:
+            return result, False
+        config = _config_update(current_config, changes)
+        if config is None:
+            return FOSCAM_SUCCESS, False
+        result, _ = await self.execute_command(set_cmd, config)
+        return result, True
+
+    async def set_motion_detection(self, enabled=1):
+        """
+        Get the current config and set the motion detection on or off,
+        the config is not written if it already has that state
+        """
+        result, _ = await self.set_config_if_changed(
+            "getMotionDetectConfig", "setMotionDetectConfig", {"isEnable": enabled}
+        )
+        return result
+
+    async def enable_motion_detection(self):
+        """
+        Enable motion detection
+        """
+        return await self.set_motion_detection(1)
+
+    async def disable_motion_detection(self):
+        """
+        disable motion detection
+        """
+        return await self.set_motion_detection(0)
+
+    async def set_motion_detection1(self, enabled=1):
+        """
+        Get the current config and set the motion detection on or off,
+        the config is not written if it already has that state
+        """
+        result, _ = await self.set_config_if_changed(
+            "getMotionDetectConfig1", "setMotionDetectConfig1", {"isEnable": enabled}
+        )
+        return result
+
+    async def enable_motion_detection1(self):
+        """
+        Enable motion detection
+        """
+        await self.set_motion_detection1(1)
+
+    async def disable_motion_detection1(self):
+        """
+        disable motion detection
+        """
+        await self.set_motion_detection1(0)
+
+    async def iter_log(self, since=0, count=10, prefetch=4):
+        """
+        Yield the LogRecords from offset since to the end of the log,
+        fetching up to prefetch pages of count records ahead at once.
+        Raises FoscamError if a page cannot be read.
+        """
+
+        def fetch(offset):
+            return asyncio.ensure_future(self.get_log(offset, count))
+
+        # The log size is only known from the first page, read ahead anyway.
+        pages = deque(
+            (offset, fetch(offset))
+            for offset in range(since, since + prefetch * count, count)
+        )
+        next_offset = since + prefetch * count
+        total = None
+        try:
+            while pages:
+                offset, page = pages.popleft()
+                if total is not None and offset >= total:
+                    page.cancel()
+                    continue
+                code, params = await page
+                if code != FOSCAM_SUCCESS:
+                    raise FoscamError(code)
+                total = int(params.get("totalCnt") or 0)
+                while len(pages) < prefetch and next_offset < total:
+                    pages.append((next_offset, fetch(next_offset)))
+                    next_offset += count
+                for record in decode_log_page(params, offset):
+                    yield record
+        finally:
+            for _, page in pages:
+                page.cancel()
+
+    async def scan_wifi(self, timeout=60, delay=1, max_delay=8):
+        """
+        Scan the APs around the camera and return them as WifiAPs.
+        Runs refreshWifiList, then polls getWifiList from delay seconds on,
+        doubling the wait up to max_delay, until the camera lists APs, and
+        reads the other pages at once.
+        Raises FoscamError if the scan fails, or does not list APs within
+        timeout seconds.
+        """
+        code, _ = await self.refresh_wifi_list()
+        if code != FOSCAM_SUCCESS:
+            raise FoscamError(code)
+        end = monotonic() + timeout
+        while True:
+            await asyncio.sleep(max(min(delay, end - monotonic()), 0))
+            code, params = await self.get_wifi_list(0)
+            if self._wifi_scan_done(code, params):
+                break
+            if monotonic() >= end:
+                if code == FOSCAM_SUCCESS:
+                    # No AP in range
+                    break
+                raise FoscamError(ERROR_FOSCAM_TIMEOUT)
+            delay = min(delay * 2, max_delay)
+        aps = decode_wifi_page(params)
+        total = int(params.get("totalCnt") or 0)
+        # Step by the records of a page, 10, whether or not they hold an AP.
+        step = int(params.get("curCnt") or 0) or 10
+        pages = await asyncio.gather(
+            *(self.get_wifi_list(startno) for startno in range(step, total, step))
+        )
+        for code, params in pages:
+            if code != FOSCAM_SUCCESS:
+                raise FoscamError(code)
+            aps.extend(decode_wifi_page(params))
+        return aps
@@ -0,0 +1,270 @@
+"""
+An append-only archive of snapshots in large segment files
+"""
+
+import mmap
+import os
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from struct import Struct
+from threading import Lock
+from time import time
+
+from libpyfoscam.foscam import FOSCAM_SUCCESS
+
+# A record is this header, the camera name in utf-8, then the frame.
+_RECORD = Struct("<4sHId")
+_MAGIC = b"FSNP"
+_SEGMENT = re.compile(r"segment-(\d{6})\.dat$")
+# The index of a closed segment is this header, the camera names, each
+# as its length then utf-8, then an entry per record.
+_INDEX = Struct("<4sQH")
+_INDEX_MAGIC = b"FSNI"
+_NAME = Struct("<H")
+# An index entry: the camera of the record, as index in the names, and
+# the time, offset and length of its frame.
+_ENTRY = Struct("<HdQI")
+
+
+class _CameraIndex(object):
+    """
+    The frames of a camera in time order, as compact columns.
+    """
+
+    def __init__(self):
+        self.times = array("d")
+        self.segments = array("I")
+        self.offsets = array("Q")
+        self.lengths = array("I")
+
+    def add(self, timestamp, segment, offset, length):
+        times = self.times
+        if not times or timestamp >= times[-1]:
+            times.append(timestamp)
+            self.segments.append(segment)
+            self.offsets.append(offset)
+            self.lengths.append(length)
+            return
+        index = bisect_right(times, timestamp)
+        times.insert(index, timestamp)
+        self.segments.insert(index, segment)
+        self.offsets.insert(index, offset)
+        self.lengths.insert(index, length)
+
+
+class SnapshotArchive(object):
+    """
+    Store snapshots of many cameras in append-only segment files of about
+    segment_size bytes in directory, instead of a file each.
+
+    Each record holds the camera name and time of its frame, and each
+    closed segment gets an index file of its records. When opened, the
+    archive reads these and only scans the segment still open, to build a
+    time index per camera, kept in memory as arrays. Frames are read
+    through mmap as memoryviews, with no copy; release them before closing
+    the archive.
+
+    An archive can be the handler of a SnapshotScheduler.
+    """
+
+    def __init__(self, directory, segment_size=256 * 1024 * 1024):
+        self.directory = directory
+        self.segment_size = segment_size
+        self._index = {}
+        self._maps = {}
+        self._lock = Lock()
+        self._file = None
+        # The (name, timestamp, offset, length) of the open segment records.
+        self._records = []
+        os.makedirs(directory, exist_ok=True)
+        segments = sorted(
+            int(match.group(1))
+            for match in map(_SEGMENT.match, os.listdir(directory))
+            if match
+        )
+        for segment in segments[:-1]:
+            if not self._load_index(segment):
+                # Closed before its index was written.
+                self._records = []
+                self._load(segment)
+                self._write_index(segment)
+        self._records = []
+        end = self._load(segments[-1]) if segments else 0
+        self._segment = segments[-1] if segments else 1
+        self._open(end)
+
+    def _path(self, segment, extension="dat"):
+        return os.path.join(self.directory, f"segment-{segment:06d}.{extension}")
+
+    def _load_index(self, segment):
+        """
+        Index the records of a closed segment from its index file; return
+        False if it is missing or does not match the segment.
+        """
+        try:
+            with open(self._path(segment, "idx"), "rb") as f:
+                data = f.read()
+            size = os.path.getsize(self._path(segment))
+        except FileNotFoundError:
+            return False
+        if len(data) < _INDEX.size:
+            return False
+        magic, end, count = _INDEX.unpack_from(data)
+        if magic != _INDEX_MAGIC or end != size:
+            return False
+        cameras = []
+        pos = _INDEX.size
+        for _ in range(count):
+            (length,) = _NAME.unpack_from(data, pos)
+            pos += _NAME.size
+            cameras.append(data[pos : pos + length].decode("utf-8"))
+            pos += length
+        if (len(data) - pos) % _ENTRY.size:
+            return False
+        cameras = [self._camera(name) for name in cameras]
+        for camera, timestamp, offset, length in _ENTRY.iter_unpack(data[pos:]):
+            cameras[camera].add(timestamp, segment, offset, length)
+        return True
+
+    def _write_index(self, segment):
+        """
+        Write the index file of the records of a segment being closed.
+        """
+        ids = {}
+        entries = []
+        for name, timestamp, offset, length in self._records:
+            camera = ids.setdefault(name, len(ids))
+            entries.append(_ENTRY.pack(camera, timestamp, offset, length))
+        size = os.path.getsize(self._path(segment))
+        parts = [_INDEX.pack(_INDEX_MAGIC, size, len(ids))]
+        for name in ids:
+            encoded = name.encode("utf-8")
+            parts.append(_NAME.pack(len(encoded)) + encoded)
+        path = self._path(segment, "idx")
+        temporary = f"{path}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(b"".join(parts + entries))
+        os.replace(temporary, path)
+        self._records = []
+
+    def _load(self, segment):
+        """
+        Index the records of a segment by scanning it and return the end of
+        the last complete one.
+        """
+        with open(self._path(segment), "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if not size:
+                return 0
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                pos = 0
+                while pos + _RECORD.size <= size:
+                    magic, name_length, length, timestamp = _RECORD.unpack_from(
+                        data, pos
+                    )
+                    start = pos + _RECORD.size + name_length
+                    if magic != _MAGIC or start + length > size:
+                        break
+                    name = data[pos + _RECORD.size : start].decode("utf-8")
+                    self._camera(name).add(timestamp, segment, start, length)
+                    self._records.append((name, timestamp, start, length))
+                    pos = start + length
+        return pos
+
+    def _open(self, end):
+        path = self._path(self._segment)
+        self._file = open(path, "ab")
+        # Drop a record cut short by a crash.
+        self._file.truncate(end)
+        self._size = end
+
+    def _camera(self, name):
+        index = self._index.get(name)
+        if index is None:
+            index = self._index[name] = _CameraIndex()
+        return index
+
+    def append(self, name, data, timestamp=None):
+        """
+        Append a frame of camera name, any bytes-like object, taken at
+        timestamp, or now.
+        """
+        if timestamp is None:
+            timestamp = time()
+        encoded = name.encode("utf-8")
+        length = len(memoryview(data).cast("B"))
+        header = _RECORD.pack(_MAGIC, len(encoded), length, timestamp) + encoded
+        with self._lock:
+            if self._size and self._size + len(header) + length > self.segment_size:
+                self._file.close()
+                self._write_index(self._segment)
+                self._segment += 1
+                self._open(0)
+            self._file.write(header)
+            self._file.write(data)
+            self._file.flush()
+            start = self._size + len(header)
+            self._size = start + length
+            self._camera(name).add(timestamp, self._segment, start, length)
+            self._records.append((name, timestamp, start, length))
+
+    def __call__(self, name, rc, data, timestamp=None):
+        if rc == FOSCAM_SUCCESS and data:
+            self.append(name, data, timestamp)
+
+    def cameras(self):
+        with self._lock:
+            return list(self._index)
+
+    def times(self, name):
+        """
+        Return the times of the frames of camera name, in order, as array.
+        """
+        with self._lock:
+            index = self._index.get(name)
+            return array("d", index.times) if index is not None else array("d")
+
+    def _map(self, segment, end):
+        """
+        Return the mmap of a segment holding at least end bytes.
+        """
+        data = self._maps.get(segment)
+        if data is None or len(data) < end:
+            with open(self._path(segment), "rb") as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            # An older, shorter map is left to be freed with its views.
+            self._maps[segment] = data
+        return data
+
+    def frames(self, name, start=None, end=None):
+        """
+        Return the (timestamp, memoryview) pairs of the frames of camera
+        name taken from start to end included, in time order.
+        """
+        with self._lock:
+            index = self._index.get(name)
+            if index is None:
+                return []
+            times = index.times
+            first = 0 if start is None else bisect_left(times, start)
+            last = len(times) if end is None else bisect_right(times, end)
+            frames = []
+            for i in range(first, last):
+                offset = index.offsets[i]
+                length = index.lengths[i]
+                data = self._map(index.segments[i], offset + length)
+                frames.append(
+                    (times[i], memoryview(data)[offset : offset + length])
+                )
+            return frames
+
+    def close(self):
+        """
+        Close the segment files. Raises BufferError while frames are in use.
+        """
+        with self._lock:
+            for segment, data in list(self._maps.items()):
+                data.close()
+                del self._maps[segment]
+            self._file.close()
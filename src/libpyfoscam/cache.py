@@ -0,0 +1,146 @@
+"""
+Caching of camera responses
+"""
+
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+
+# Seconds a response stays cached, by command. 0 disables caching.
+COMMAND_TTLS = {
+    "getDevState": 1,
+    "getAlexaState": 1,
+    "getSystemTime": 0,
+    "getLog": 0,
+    "getWifiList": 0,
+    "getRecordPath": 10,
+}
+
+# Reads made stale by commands that do not follow the setX/getX naming.
+# None stands for every read of the camera.
+COMMAND_INVALIDATES = {
+    "setSubStreamFormat": ("getSubVideoStreamType",),
+    "setWifiSetting": ("getWifiConfig",),
+    "mirrorVideo": ("getMirrorAndFlipSetting",),
+    "flipVideo": ("getMirrorAndFlipSetting",),
+    "openInfraLed": ("getInfraLedConfig", "getDevState"),
+    "closeInfraLed": ("getInfraLedConfig", "getDevState"),
+    "alexaSleep": ("getAlexaState",),
+    "alexaWakeUp": ("getAlexaState",),
+    "setMotionDetectConfig": ("getMotionDetectConfig", "getDevState"),
+    "setMotionDetectConfig1": ("getMotionDetectConfig1", "getDevState"),
+    "setIpInfo": None,
+    "setPortInfo": None,
+    "changeUserName": None,
+    "changePassword": None,
+}
+
+
+def invalidated_reads(cmd):
+    """
+    Return the lower-cased read commands made stale by cmd, an empty
+    tuple if none, or None if every read of the camera is stale.
+    A setX command invalidates getX, whatever the case of X.
+    """
+    if cmd in COMMAND_INVALIDATES:
+        reads = COMMAND_INVALIDATES[cmd]
+        if reads is None:
+            return None
+        reads = {read.lower() for read in reads}
+    else:
+        reads = set()
+    if cmd.startswith("set"):
+        reads.add("get" + cmd[3:].lower())
+    return reads
+
+
+class ResponseCache(object):
+    """
+    A least recently used cache of get command responses.
+
+    Successful responses are kept for the TTL of their command (ttls,
+    falling back on COMMAND_TTLS and default_ttl) in seconds, up to
+    max_entries responses over all cameras sharing the cache. Any other
+    command drops the cached reads it makes stale, see invalidated_reads.
+    """
+
+    def __init__(self, max_entries=1024, default_ttl=60, ttls=None):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.ttls = dict(COMMAND_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = Lock()
+
+    @staticmethod
+    def _key(camera, cmd, params):
+        return camera, cmd, tuple(sorted(params.items())) if params else ()
+
+    def generation(self, camera):
+        """
+        Return a token to pass to update for a command about to be sent,
+        so a response read before an invalidation is not cached after it.
+        """
+        with self._lock:
+            return self._generations.get(camera, 0)
+
+    def get(self, camera, cmd, params=None):
+        """
+        Return the cached (code, params) of a read, or None.
+        """
+        key = self._key(camera, cmd, params)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, response = entry
+            if monotonic() >= expires:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return response
+
+    def update(self, camera, cmd, params, code, response, generation):
+        """
+        Cache the response of a read, or drop the reads a write made stale.
+        """
+        if not cmd.startswith("get"):
+            self.invalidate(camera, cmd)
+            return
+        ttl = self.ttls.get(cmd, self.default_ttl)
+        if code != 0 or not ttl:
+            return
+        key = self._key(camera, cmd, params)
+        with self._lock:
+            if self._generations.get(camera, 0) != generation:
+                return
+            self._entries[key] = (monotonic() + ttl, (code, response))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, camera, cmd=None):
+        """
+        Drop the cached reads of a camera made stale by cmd, or all of them.
+        """
+        reads = invalidated_reads(cmd) if cmd is not None else None
+        if reads is not None and not reads:
+            return
+        with self._lock:
+            self._generations[camera] = self._generations.get(camera, 0) + 1
+            stale = [
+                key
+                for key in self._entries
+                if key[0] == camera and (reads is None or key[1].lower() in reads)
+            ]
+            for key in stale:
+                del self._entries[key]
+
+    def clear(self):
+        """
+        Drop every cached response.
+        """
+        with self._lock:
+            self._entries.clear()
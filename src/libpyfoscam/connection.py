@@ -0,0 +1,205 @@
+"""
+Persistent HTTP connections to Foscam cameras
+"""
+
+import http.client
+import warnings
+from contextlib import contextmanager
+from threading import Lock
+from time import monotonic
+
+try:
+    import ssl
+
+    ssl_enabled = True
+except ImportError:
+    ssl_enabled = False
+
+_ssl_contexts = {}
+_ssl_contexts_lock = Lock()
+
+
+def get_ssl_context(cafile=None, minimum_version=None):
+    """
+    Return a process-wide SSL context for the given verification settings.
+
+    Building a context is expensive, so one is shared by every camera with
+    the same settings. Without ``cafile`` the camera certificate is not
+    verified, as the cameras ship with self-signed certificates. With
+    ``cafile`` only certificates from that file are trusted, which allows
+    pinning a camera's own certificate; host names are not checked because
+    cameras are usually addressed by IP. ``minimum_version`` is an
+    ssl.TLSVersion and defaults to TLS 1.0, which older firmware requires.
+    """
+    if minimum_version is None:
+        minimum_version = ssl.TLSVersion.TLSv1
+    key = (cafile, minimum_version)
+    with _ssl_contexts_lock:
+        context = _ssl_contexts.get(key)
+        if context is None:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+            context.check_hostname = False
+            if cafile:
+                context.load_verify_locations(cafile)
+                context.verify_mode = ssl.CERT_REQUIRED
+            else:
+                context.verify_mode = ssl.CERT_NONE
+            if minimum_version < ssl.TLSVersion.TLSv1_2:
+                # Legacy protocol versions are refused at the default level.
+                try:
+                    context.set_ciphers("DEFAULT:@SECLEVEL=0")
+                except ssl.SSLError:
+                    pass
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", DeprecationWarning)
+                context.minimum_version = minimum_version
+            _ssl_contexts[key] = context
+    return context
+
+
+class _HTTPSConnection(http.client.HTTPSConnection):
+    """
+    An HTTPS connection resuming the TLS session of its pool.
+    """
+
+    def __init__(self, host, port, pool, **kwargs):
+        super(_HTTPSConnection, self).__init__(host, port, **kwargs)
+        self._pool = pool
+
+    def connect(self):
+        http.client.HTTPConnection.connect(self)
+        self.sock = self._pool.ssl_context.wrap_socket(
+            self.sock, server_hostname=self.host, session=self._pool.ssl_session
+        )
+
+
+class ConnectionPool(object):
+    """
+    A pool of persistent HTTP/1.1 connections to one camera.
+
+    Connections are reused across commands so a command costs one round trip
+    instead of a TCP (and TLS) handshake plus a round trip. New TLS
+    connections resume the session of the previous one where the camera
+    allows it. At most ``size``
+    idle connections are kept; more may be open while many commands run at
+    once, the surplus is closed when released. Idle connections older than
+    ``idle_timeout`` seconds are dropped, and a request that fails on a reused
+    connection is retried once on a fresh one, since the camera may have
+    closed it in the meantime.
+    """
+
+    def __init__(
+        self, host, port, ssl_context=None, size=2, idle_timeout=60, timeout=5
+    ):
+        self.host = host
+        self.port = port
+        self.ssl_context = ssl_context
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.ssl_session = None
+        self._idle = []
+        self._lock = Lock()
+
+    def _new_connection(self):
+        if self.ssl_context is not None:
+            return _HTTPSConnection(
+                self.host,
+                self.port,
+                self,
+                timeout=self.timeout,
+                context=self.ssl_context,
+            )
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def connect(self):
+        """
+        Return a new connection outside of the pool, for long-lived requests
+        such as streams. The caller closes it.
+        """
+        return self._new_connection()
+
+    def _acquire(self):
+        """
+        Return (connection, reused), preferring the most recently used idle one.
+        """
+        now = monotonic()
+        stale = []
+        conn = None
+        with self._lock:
+            while self._idle:
+                candidate, released = self._idle.pop()
+                if now - released > self.idle_timeout:
+                    stale.append(candidate)
+                else:
+                    conn = candidate
+                    break
+        for candidate in stale:
+            candidate.close()
+        if conn is not None:
+            return conn, True
+        return self._new_connection(), False
+
+    def _release(self, conn):
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append((conn, monotonic()))
+                return
+        conn.close()
+
+    @contextmanager
+    def stream(self, path):
+        """
+        Send a GET request for ``path`` and yield the http.client.HTTPResponse
+        to read the body from as it arrives. The connection is reused if the
+        body was read completely.
+        Raises http.client.HTTPException or OSError on failure.
+        """
+        for attempt in range(2):
+            conn, reused = self._acquire()
+            try:
+                conn.request("GET", path)
+                response = conn.getresponse()
+            except TimeoutError:
+                conn.close()
+                raise
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                if reused and attempt == 0:
+                    continue
+                raise
+            break
+        if response.status != 200:
+            conn.close()
+            raise http.client.HTTPException(
+                f"HTTP {response.status} {response.reason}"
+            )
+        try:
+            yield response
+        except BaseException:
+            conn.close()
+            raise
+        session = getattr(conn.sock, "session", None)
+        if session is not None:
+            self.ssl_session = session
+        if response.isclosed() and not response.will_close:
+            self._release(conn)
+        else:
+            conn.close()
+
+    def request(self, path):
+        """
+        Send a GET request for ``path`` and return the response body.
+        Raises http.client.HTTPException or OSError on failure.
+        """
+        with self.stream(path) as response:
+            return response.read()
+
+    def close(self):
+        """
+        Close all idle connections.
+        """
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            conn.close()
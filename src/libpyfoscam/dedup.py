@@ -0,0 +1,118 @@
+"""
+Suppressing duplicate frames by perceptual hashing
+"""
+
+from threading import Lock
+
+from libpyfoscam.foscam import FOSCAM_SUCCESS
+from libpyfoscam.image import Image, decode_jpeg, pillow_enabled
+
+
+def dhash(frame, size=8):
+    """
+    Return the difference hash of a frame, JPEG data or a PIL image, as an
+    int of size * size bits: whether each pixel of the frame reduced to
+    size + 1 by size grey pixels is brighter than its right neighbour.
+    Requires Pillow.
+    """
+    if not pillow_enabled:
+        raise ImportError("Perceptual hashing requires Pillow")
+    image = frame
+    if not isinstance(image, Image.Image):
+        image, _ = decode_jpeg(frame, "L", (size + 1, size))
+    pixels = image.convert("L").resize((size + 1, size), Image.BILINEAR).tobytes()
+    value = 0
+    for row in range(0, len(pixels), size + 1):
+        for col in range(row, row + size):
+            value = (value << 1) | (pixels[col] > pixels[col + 1])
+    return value
+
+
+def hamming(a, b):
+    """
+    Return the number of bits differing between two hashes.
+    """
+    return bin(a ^ b).count("1")
+
+
+class _CameraDedup(object):
+    def __init__(self):
+        self.hash = None
+        self.references = 0
+        self.frames = 0
+        self.duplicates = 0
+
+
+class FrameDeduplicator(object):
+    """
+    Tell the frames of each camera that look the same as the last frame
+    kept, those whose dHash differs from it by at most threshold bits.
+
+    The kept frame of a camera counts the duplicates referring to it, and
+    each camera counts its frames and duplicates. A deduplicator can wrap
+    the handler of a SnapshotScheduler to drop the duplicates.
+    """
+
+    def __init__(self, threshold=4, size=8):
+        self.threshold = threshold
+        self.size = size
+        self._cameras = {}
+        self._lock = Lock()
+
+    def check(self, name, frame):
+        """
+        Return (duplicate, hash) for a frame of camera name. A frame that
+        is no duplicate becomes the kept frame of the camera.
+        """
+        value = dhash(frame, self.size)
+        with self._lock:
+            camera = self._cameras.get(name)
+            if camera is None:
+                camera = self._cameras[name] = _CameraDedup()
+            camera.frames += 1
+            if camera.hash is not None and (
+                hamming(camera.hash, value) <= self.threshold
+            ):
+                camera.duplicates += 1
+                camera.references += 1
+                return True, value
+            camera.hash = value
+            camera.references = 0
+            return False, value
+
+    def references(self, name):
+        """
+        Return the number of duplicates of the kept frame of camera name.
+        """
+        with self._lock:
+            camera = self._cameras.get(name)
+            return camera.references if camera is not None else 0
+
+    def wrap(self, handler):
+        """
+        Return a snapshot handler(name, rc, data, timestamp) that passes
+        the snapshots which are no duplicates on to handler.
+        """
+
+        def dedup_handler(name, rc, data, timestamp=None):
+            if rc == FOSCAM_SUCCESS and data and self.check(name, data)[0]:
+                return None
+            return handler(name, rc, data, timestamp)
+
+        return dedup_handler
+
+    def stats(self):
+        """
+        Return a dict of camera names to dicts of frames, duplicates,
+        hit_rate (the fraction of duplicates) and references.
+        """
+        with self._lock:
+            return {
+                name: {
+                    "frames": camera.frames,
+                    "duplicates": camera.duplicates,
+                    "hit_rate": camera.duplicates / camera.frames,
+                    "references": camera.references,
+                }
+                for name, camera in self._cameras.items()
+            }
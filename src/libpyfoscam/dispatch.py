@@ -0,0 +1,207 @@
+"""
+Per-camera command dispatching
+"""
+
+import heapq
+from concurrent.futures import Future
+from itertools import count
+from threading import Event, Lock, Timer
+from time import monotonic
+
+# Command priorities, lower values are sent first.
+PRIORITY_HIGH = 0  # PTZ control, operators are waiting on it
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2  # Bulk reads
+
+COMMAND_PRIORITIES = {
+    "getProductAllInfo": PRIORITY_LOW,
+    "getLog": PRIORITY_LOW,
+    "getWifiList": PRIORITY_LOW,
+    "refreshWifiList": PRIORITY_LOW,
+}
+
+# Commands after which the camera blocks other operations, in seconds.
+BLOCKING_COMMANDS = {
+    "refreshWifiList": 20,
+}
+
+
+def command_priority(cmd):
+    """
+    Return the priority of a CGI command: PTZ and zoom commands are
+    PRIORITY_HIGH, bulk reads PRIORITY_LOW, anything else PRIORITY_NORMAL.
+    """
+    priority = COMMAND_PRIORITIES.get(cmd)
+    if priority is not None:
+        return priority
+    if cmd.startswith(("ptz", "zoom")):
+        return PRIORITY_HIGH
+    return PRIORITY_NORMAL
+
+
+class CameraDispatcher(object):
+    """
+    Limit the commands running at once on one camera.
+
+    At most max_concurrent commands run on the camera, the rest wait by
+    priority (see command_priority), then in order of arrival. After a
+    command listed in busy_commands (by default BLOCKING_COMMANDS) the
+    camera is marked busy for the given number of seconds and waiting
+    commands are held back instead of timing out.
+    """
+
+    def __init__(self, max_concurrent=1, busy_commands=None):
+        self.max_concurrent = max_concurrent
+        self.busy_commands = (
+            BLOCKING_COMMANDS if busy_commands is None else busy_commands
+        )
+        self._running = 0
+        self._busy_until = 0.0
+        self._pending = []
+        self._sequence = count()
+        self._timer = None
+        self._lock = Lock()
+
+    @property
+    def busy(self):
+        """
+        Whether the camera is still blocked by a long-running command.
+        """
+        return monotonic() < self._busy_until
+
+    def clear_busy(self):
+        """
+        End the busy period early, once the camera is known to be done.
+        """
+        with self._lock:
+            self._busy_until = 0.0
+            ready = self._next_ready()
+        for start in ready:
+            start()
+
+    def enqueue(self, cmd, start):
+        """
+        Call start() once cmd may run. The caller must call release(cmd)
+        when the command has finished.
+        """
+        entry = (command_priority(cmd), next(self._sequence), start)
+        with self._lock:
+            heapq.heappush(self._pending, entry)
+            ready = self._next_ready()
+        for start in ready:
+            start()
+
+    def release(self, cmd):
+        """
+        Free the slot held by cmd and start waiting commands.
+        """
+        with self._lock:
+            self._running -= 1
+            busy = self.busy_commands.get(cmd)
+            if busy:
+                self._busy_until = max(self._busy_until, monotonic() + busy)
+            ready = self._next_ready()
+        for start in ready:
+            start()
+
+    def run(self, cmd, fn, *args, **kwargs):
+        """
+        Wait for a slot, then call fn(*args, **kwargs) in this thread.
+        """
+        event = Event()
+        self.enqueue(cmd, event.set)
+        event.wait()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self.release(cmd)
+
+    def _next_ready(self):
+        """
+        Take the commands that may start now. Called with the lock held.
+        """
+        ready = []
+        wait = self._busy_until - monotonic()
+        if wait > 0:
+            if self._pending and self._timer is None:
+                self._timer = Timer(wait, self._wake)
+                self._timer.daemon = True
+                self._timer.start()
+            return ready
+        while self._pending and self._running < self.max_concurrent:
+            self._running += 1
+            ready.append(heapq.heappop(self._pending)[2])
+        return ready
+
+    def _wake(self):
+        with self._lock:
+            self._timer = None
+            ready = self._next_ready()
+        for start in ready:
+            start()
+
+
+class SingleFlight(object):
+    """
+    Share one execution between identical calls made at the same time.
+    """
+
+    def __init__(self):
+        # Keys to [future, number of followers]
+        self._calls = {}
+        # Part of the keys, so calls made after invalidate join no older one.
+        self.generation = 0
+        self._lock = Lock()
+
+    def invalidate(self):
+        """
+        Keep the calls made from now on apart from those in flight, whose
+        outcome a write may have made stale.
+        """
+        with self._lock:
+            self.generation += 1
+
+    def join(self, key):
+        """
+        Return (future, leader) for the call identified by key. The leader
+        must run the call and hand its outcome to finish, the others wait
+        for the future.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call[1] += 1
+                return call[0], False
+            future = Future()
+            self._calls[key] = [future, 0]
+            return future, True
+
+    def abandon(self, key, future):
+        """
+        Give up the call identified by key, as its leader was cancelled.
+        Return True if other calls wait for it, so it must still run.
+        Otherwise the call is dropped and its future cancelled.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None and call[0] is future:
+                if call[1]:
+                    return True
+                del self._calls[key]
+        future.cancel()
+        return False
+
+    def finish(self, key, future, result=None, exception=None):
+        """
+        Resolve the future of the call identified by key.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None and call[0] is future:
+                del self._calls[key]
+        if future.done():
+            return
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
@@ -0,0 +1,148 @@
+"""
+A bounded thread pool running camera commands in the background
+"""
+
+import heapq
+import queue
+from concurrent.futures import Future
+from itertools import count
+from threading import Condition, Lock, Thread
+
+from libpyfoscam.dispatch import PRIORITY_HIGH, PRIORITY_NORMAL
+
+
+class CommandExecutor(object):
+    """
+    Run commands on at most max_workers threads, returning a Future for each.
+
+    Waiting commands start by priority, then in order of submission.
+    At most max_queue commands wait to start. When the queue is full,
+    submit blocks until there is room, or raises queue.Full once timeout
+    seconds have passed, so a burst of commands slows the caller down
+    instead of piling up threads or memory. PRIORITY_HIGH commands never
+    wait for room.
+    """
+
+    def __init__(self, max_workers=16, max_queue=256):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._tasks = []
+        self._sequence = count()
+        self._queued = 0
+        self._threads = []
+        self._idle = 0
+        self._cond = Condition(Lock())
+
+    def submit(
+        self,
+        fn,
+        *args,
+        timeout=None,
+        priority=PRIORITY_NORMAL,
+        dispatcher=None,
+        command=None,
+        **kwargs,
+    ):
+        """
+        Schedule fn(*args, **kwargs) and return its Future.
+        With a dispatcher, the call waits for a slot for command on the
+        dispatcher's camera without holding a thread meanwhile.
+        """
+        with self._cond:
+            if priority > PRIORITY_HIGH and not self._cond.wait_for(
+                lambda: self._queued < self.max_queue, timeout
+            ):
+                raise queue.Full
+            self._queued += 1
+        future = Future()
+        task = (future, fn, args, kwargs, dispatcher, command)
+        if dispatcher is None:
+            self._push(priority, task)
+        else:
+            dispatcher.enqueue(command, lambda: self._push(priority, task))
+        return future
+
+    def _push(self, priority, task):
+        with self._cond:
+            heapq.heappush(self._tasks, (priority, next(self._sequence), task))
+            busy = len(self._tasks) > self._idle
+            if busy and len(self._threads) < self.max_workers:
+                thread = Thread(target=self._work)
+                thread.daemon = True
+                self._threads.append(thread)
+                thread.start()
+            self._cond.notify_all()
+
+    def _work(self):
+        while True:
+            with self._cond:
+                self._idle += 1
+                self._cond.wait_for(lambda: self._tasks)
+                self._idle -= 1
+                task = heapq.heappop(self._tasks)[2]
+                if task is None:
+                    return
+                self._queued -= 1
+                self._cond.notify_all()
+            future, fn, args, kwargs, dispatcher, command = task
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        result = fn(*args, **kwargs)
+                    except BaseException as e:
+                        future.set_exception(e)
+                    else:
+                        future.set_result(result)
+            finally:
+                if dispatcher is not None:
+                    dispatcher.release(command)
+
+    @property
+    def queue_depth(self):
+        """
+        Number of commands waiting to start.
+        """
+        return self._queued
+
+    def shutdown(self, wait=True):
+        """
+        Stop the threads once the queued commands have run.
+        """
+        with self._cond:
+            threads, self._threads = self._threads, []
+            for _ in threads:
+                entry = (float("inf"), next(self._sequence), None)
+                heapq.heappush(self._tasks, entry)
+            self._cond.notify_all()
+        if wait:
+            for thread in threads:
+                thread.join()
+
+
+_default_executor = None
+_default_executor_lock = Lock()
+
+
+def get_default_executor():
+    """
+    Return the executor shared by cameras without one of their own.
+    """
+    global _default_executor
+    with _default_executor_lock:
+        if _default_executor is None:
+            _default_executor = CommandExecutor()
+        return _default_executor
+
+
+def set_default_executor(max_workers=16, max_queue=256):
+    """
+    Replace the shared executor with one of the given size.
+    """
+    global _default_executor
+    with _default_executor_lock:
+        old, _default_executor = _default_executor, CommandExecutor(
+            max_workers, max_queue
+        )
+    if old is not None:
+        old.shutdown(wait=False)
+    return _default_executor
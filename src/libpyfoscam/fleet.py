@@ -0,0 +1,159 @@
+"""
+A module to operate many Foscam cameras at once
+"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from threading import Lock
+from time import monotonic, sleep
+
+from libpyfoscam.foscam import ERROR_FOSCAM_TIMEOUT, FoscamCamera
+from libpyfoscam.scheduler import SnapshotScheduler
+from libpyfoscam.wifi import WifiSurvey
+
+
+class FoscamFleet(object):
+    """
+    A set of named cameras, running commands on many of them in parallel.
+
+    At most concurrency commands run at once over the whole fleet.
+    """
+
+    def __init__(self, cameras=None, concurrency=64):
+        self.cameras = dict(cameras or {})
+        self.concurrency = concurrency
+        self._executor = None
+        self._lock = Lock()
+
+    @classmethod
+    def from_config(cls, data, concurrency=64, **kwargs):
+        """
+        Create a fleet from the camera config, as read from cameras.json:
+        a dict of camera names to dicts of host, port, login and password.
+        Other keyword arguments are passed to each FoscamCamera.
+        """
+        cameras = {}
+        for name, values in data.items():
+            cameras[name] = FoscamCamera(
+                values["host"],
+                values["port"],
+                values["login"],
+                values["password"],
+                **kwargs,
+            )
+        return cls(cameras, concurrency)
+
+    def __getitem__(self, name):
+        return self.cameras[name]
+
+    def __iter__(self):
+        return iter(self.cameras)
+
+    def __len__(self):
+        return len(self.cameras)
+
+    @property
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.concurrency)
+            return self._executor
+
+    def select(self, names=None, where=None):
+        """
+        Return the (name, camera) pairs in names, or all, for which
+        where(name, camera) is true, or all of them.
+        """
+        if names is None:
+            names = self.cameras
+        return [
+            (name, self.cameras[name])
+            for name in names
+            if where is None or where(name, self.cameras[name])
+        ]
+
+    def run(self, method, *args, names=None, where=None, deadline=None, **kwargs):
+        """
+        Call a FoscamCamera method on the selected cameras in parallel and
+        yield (name, result) pairs as the calls complete.
+        method is a method name, or a function called with the camera.
+        A call raising an exception yields the exception as its result.
+        Cameras still running after deadline seconds yield
+        (ERROR_FOSCAM_TIMEOUT, None) and their pending calls are cancelled.
+        """
+
+        def call(camera):
+            if callable(method):
+                return method(camera, *args, **kwargs)
+            return getattr(camera, method)(*args, **kwargs)
+
+        futures = {
+            self.executor.submit(call, camera): name
+            for name, camera in self.select(names, where)
+        }
+        end = None if deadline is None else monotonic() + deadline
+        pending = set(futures)
+        while pending:
+            timeout = None if end is None else max(end - monotonic(), 0)
+            done, pending = wait(pending, timeout, FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                error = future.exception()
+                yield futures[future], future.result() if error is None else error
+        for future in pending:
+            future.cancel()
+            yield futures[future], (ERROR_FOSCAM_TIMEOUT, None)
+
+    def call(self, method, *args, **kwargs):
+        """
+        Like run, but return a dict of camera names to results.
+        """
+        return dict(self.run(method, *args, **kwargs))
+
+    def schedule_snapshots(self, handler, fps=1.0, jitter=0.1, names=None):
+        """
+        Start taking snapshots of the cameras at fps each, passing them to
+        handler(name, rc, data, timestamp).
+        Returns the started SnapshotScheduler; stop it when done.
+        """
+        return SnapshotScheduler(self, handler, fps, jitter, names).start()
+
+    def survey_wifi(self, concurrency=8, stagger=2, names=None, **kwargs):
+        """
+        Scan the Wi-Fi of the selected cameras and return a WifiSurvey.
+        Cameras are blocked while they scan, so at most concurrency scans
+        run at once, started at least stagger seconds apart. Other keyword
+        arguments are passed to FoscamCamera.scan_wifi.
+        """
+        survey = WifiSurvey()
+        cameras = deque(self.select(names))
+        futures = {}
+        started = None
+        while cameras or futures:
+            while cameras and len(futures) < concurrency:
+                if started is not None:
+                    sleep(max(started + stagger - monotonic(), 0))
+                name, camera = cameras.popleft()
+                futures[self.executor.submit(camera.scan_wifi, **kwargs)] = name
+                started = monotonic()
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = futures.pop(future)
+                error = future.exception()
+                if error is None:
+                    survey.add(name, future.result())
+                else:
+                    survey.errors[name] = error
+        return survey
+
+    def close(self):
+        """
+        Close the connections of all cameras.
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+        for camera in self.cameras.values():
+            camera.close()
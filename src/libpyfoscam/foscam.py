@@ -2,30 +2,26 @@
 A module to manage Foscam FI9936P cameras
 """
 
-try:
-    from urllib import urlopen
-except ImportError:
-    from urllib.request import urlopen
 try:
     from urllib import urlencode
 except ImportError:
     from urllib.parse import urlencode
-try:
-    from urllib import unquote
-except ImportError:
-    from urllib.parse import unquote
-
-import xml.etree.ElementTree as ET
-from threading import Thread
-
-try:
-    import ssl
-
-    ssl_enabled = True
-except ImportError:
-    ssl_enabled = False
 
-from collections import OrderedDict
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from threading import local
+from time import monotonic, sleep
+
+from libpyfoscam.cache import invalidated_reads
+from libpyfoscam.connection import ConnectionPool, get_ssl_context, ssl_enabled
+from libpyfoscam.dispatch import CameraDispatcher, SingleFlight, command_priority
+from libpyfoscam.executor import get_default_executor
+from libpyfoscam.log import decode_log_page
+from libpyfoscam.response import CGIResultParser
+from libpyfoscam.results import typed_result
+from libpyfoscam.snapshot import SnapshotBufferRing, read_into
+from libpyfoscam.stream import MJPEGStreamReader
+from libpyfoscam.wifi import decode_wifi_page
 
 # Foscam error codes
 FOSCAM_SUCCESS = 0
@@ -47,18 +43,86 @@ class FoscamError(Exception):
         return f"ErrorCode: {self.code}"
 
 
+def _copy_params(params):
+    return OrderedDict(params) if params is not None else None
+
+
+def _config_update(config, changes):
+    """
+    Return the params writing config back with changes applied, or None if
+    it already has every changed value. Only the parameters the camera
+    returned and the changes are written, empty ones as empty strings.
+    """
+    if all(config.get(name) == str(value) for name, value in changes.items()):
+        return None
+    params = OrderedDict(
+        (name, "" if value is None else value) for name, value in config.items()
+    )
+    params.update(changes)
+    return params
+
+
 class FoscamCamera(object):
     """A python implementation for foscam FI9936P"""
 
-    def __init__(self, host, port, usr, pwd, daemon=False, ssl=None, verbose=False):
+    def __init__(
+        self,
+        host,
+        port,
+        usr,
+        pwd,
+        daemon=False,
+        ssl=None,
+        verbose=False,
+        pool_size=2,
+        pool_idle_timeout=60,
+        ssl_cafile=None,
+        ssl_minimum_version=None,
+        executor=None,
+        queue_timeout=None,
+        max_concurrent=None,
+        coalesce_reads=True,
+        cache=None,
+        typed_results=False,
+    ):
         """
-        If daemon is True, the command will be sent unblocked.
+        If daemon is True, the command will be sent unblocked: it runs on
+        executor, a CommandExecutor shared by all cameras unless given, and
+        a concurrent.futures.Future is returned. When the executor queue is
+        full, sending waits up to queue_timeout seconds, then raises
+        queue.Full.
+        If max_concurrent is set, at most that many commands run on the
+        camera at once and the others wait their turn, also while the
+        camera is blocked by commands such as refreshWifiList.
+        Waiting PTZ commands are sent first and bulk reads last.
+        With coalesce_reads, a get command issued while an identical one is
+        in flight shares its response instead of being sent again, unless
+        a command sent since may have changed it.
+        With a ResponseCache as cache, get commands are answered from it
+        while fresh and other commands drop the reads they make stale.
+        With typed_results, commands with a result type in RESULT_TYPES
+        return a compact CGIResult with int fields instead of a dict.
+        Commands reuse up to pool_size persistent connections; connections
+        idle for more than pool_idle_timeout seconds are reopened.
+        Over HTTPS the camera certificate is only verified against
+        ssl_cafile when given, and ssl_minimum_version (an ssl.TLSVersion)
+        raises the accepted TLS version from the TLS 1.0 default.
         """
         self.host = host
         self.port = port
         self.usr = usr
         self.pwd = pwd
         self.daemon = daemon
+        self.executor = executor
+        self.queue_timeout = queue_timeout
+        self.coalesce_reads = coalesce_reads
+        self.cache = cache
+        self.typed_results = typed_results
+        self._scratch = local()
+        self._single_flight = SingleFlight()
+        self.dispatcher = None
+        if max_concurrent:
+            self.dispatcher = CameraDispatcher(max_concurrent)
         self.verbose = verbose
         self.ssl = ssl
         if ssl_enabled:
@@ -66,79 +130,268 @@ class FoscamCamera(object):
                 self.ssl = True
         if self.ssl is None:
             self.ssl = False
+        ssl_context = None
+        if self.ssl and ssl_enabled:
+            ssl_context = get_ssl_context(ssl_cafile, ssl_minimum_version)
+        self._pool = ConnectionPool(
+            host,
+            port,
+            ssl_context=ssl_context,
+            size=pool_size,
+            idle_timeout=pool_idle_timeout,
+        )
 
     @property
     def url(self):
         _url = f"{self.host}:{self.port}"
         return _url
 
-    def send_command(self, cmd, params=None, raw=False):
+    def _command_path(self, cmd, params=None):
         """
-        Send command to foscam camera
+        Build the request path of a CGI command.
         """
         paramstr = ""
         if params:
             paramstr = urlencode(params)
             paramstr = "&" + paramstr if paramstr else ""
-        cmdurl = f"http://{self.url}/cgi-bin/CGIProxy.fcgi?usr={self.usr}&pwd={self.pwd}&cmd={cmd}{paramstr}"
-        if self.ssl and ssl_enabled:
-            cmdurl = cmdurl.replace("http:", "https:")
+        return f"/cgi-bin/CGIProxy.fcgi?usr={self.usr}&pwd={self.pwd}&cmd={cmd}{paramstr}"
+
+    def _parse_response(self, raw_string, raw=False):
+        """
+        Parse the body of a CGI response into a code and parameters.
+        """
+        if raw:
+            if self.verbose:
+                print(f"Returning raw Foscam response: len={len(raw_string)}")
+            return FOSCAM_SUCCESS, raw_string
+        parser = CGIResultParser()
+        parser.feed(raw_string)
+        return self._parsed_response(parser)
+
+    def _parsed_response(self, parser):
+        """
+        Take the code and parameters from a CGIResultParser fed a response.
+        """
+        code, params = parser.close()
+        if code is None:
+            code = ERROR_FOSCAM_UNKNOWN
+        if self.verbose:
+            print(f"Received Foscam response: {code}, {params}")
+        return code, params
+
+    def send_command(self, cmd, params=None, raw=False, into=None):
+        """
+        Send command to foscam camera
+        With into, a picture is read into it instead of returned as bytes,
+        see snap_picture_into.
+        """
+        cmdpath = self._command_path(cmd, params)
 
         # Parse parameters from response string.
         if self.verbose:
-            print(f"Send Foscam command: {cmdurl}")
+            scheme = "https" if self.ssl and ssl_enabled else "http"
+            print(f"Send Foscam command: {scheme}://{self.url}{cmdpath}")
         try:
             raw_string = ""
-            if self.ssl and ssl_enabled:
-                gcontext = ssl.SSLContext(ssl.PROTOCOL_TLSv1)  # disable cert
-                raw_string = urlopen(cmdurl, context=gcontext, timeout=5).read()
-            else:
-                raw_string = urlopen(cmdurl, timeout=5).read()
-            if raw:
-                if self.verbose:
-                    print(f"Returning raw Foscam response: len={len(raw_string)}")
-                return FOSCAM_SUCCESS, raw_string
-            root = ET.fromstring(raw_string)
+            with self._pool.stream(cmdpath) as response:
+                content_type = response.getheader("Content-Type", "")
+                if into is not None and content_type.startswith("image/"):
+                    return FOSCAM_SUCCESS, self._read_into(response, into)
+                if raw and into is None:
+                    raw_string = response.read()
+                    return self._parse_response(raw_string, raw)
+                # Parse the result as it arrives.
+                parser = CGIResultParser()
+                chunk = response.read1(8192)
+                while chunk:
+                    parser.feed(chunk)
+                    chunk = response.read1(8192)
+                # Completes the response so the connection can be reused.
+                parser.feed(response.read())
+            code, params = self._parsed_response(parser)
+            return code, params if into is None else None
+        except BufferError:
+            raise
         except:
             if self.verbose:
                 print(f"Foscam exception: {raw_string}")
             return ERROR_FOSCAM_UNAVAILABLE, None
-        code = ERROR_FOSCAM_UNKNOWN
-        params = OrderedDict()
-        for child in root.iter():
-            if child.tag == "result":
-                code = int(child.text)
 
-            elif child.tag != "CGI_Result":
-                params[child.tag] = (
-                    unquote(child.text) if child.text is not None else None
-                )
+    def _read_into(self, response, into):
+        """
+        Read a picture into a file, buffer or SnapshotBufferRing.
+        """
+        if isinstance(into, SnapshotBufferRing):
+            view = into.next()
+            return view[: read_into(response, view, None)]
+        scratch = getattr(self._scratch, "view", None)
+        if scratch is None:
+            scratch = self._scratch.view = memoryview(bytearray(64 * 1024))
+        return read_into(response, into, scratch)
 
-        if self.verbose:
-            print(f"Received Foscam response: {code}, {params}")
-        return code, params
+    def _read_key(self, cmd, params=None, raw=False):
+        """
+        Identify a read command that may share a response, else None.
+        """
+        if not self.coalesce_reads or raw or not cmd.startswith("get"):
+            return None
+        params = tuple(sorted(params.items())) if params else ()
+        return self._single_flight.generation, cmd, params
 
-    def execute_command(self, cmd, params=None, callback=None, raw=False):
+    def _written(self, cmd):
         """
-        Execute a command and return a parsed response.
+        Keep later reads from sharing a response read before cmd, if it
+        makes any read stale.
+        """
+        if cmd.startswith("get"):
+            return
+        reads = invalidated_reads(cmd)
+        if reads is None or reads:
+            self._single_flight.invalidate()
+
+    def _typed(self, cmd, params, typed=True):
+        """
+        Convert parameters to the typed result of cmd if enabled.
+        """
+        if typed and self.typed_results:
+            return typed_result(cmd, params)
+        return params
+
+    def _follow(self, cmd, shared, callback=None, typed=True):
+        """
+        Take a response shared with other commands, from the future shared.
         """
 
-        def execute_with_callbacks(cmd, params=None, callback=None, raw=False):
-            code, params = self.send_command(cmd, params, raw)
+        def respond(code, params):
+            params = self._typed(cmd, _copy_params(params), typed)
             if callback:
                 callback(code, params)
             return code, params
 
+        if not self.daemon:
+            return respond(*shared.result())
+
+        future = Future()
+
+        def done(shared):
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                future.set_result(respond(*shared.result()))
+            except BaseException as e:
+                future.set_exception(e)
+
+        shared.add_done_callback(done)
+        return future
+
+    def execute_command(
+        self, cmd, params=None, callback=None, raw=False, into=None, typed=True
+    ):
+        """
+        Execute a command and return a parsed response.
+        With typed False, the response is a dict even with typed_results.
+        """
+        generation = None
+        if self.cache is not None and not raw:
+            response = self.cache.get(self.url, cmd, params)
+            if response is not None:
+                cached = Future()
+                cached.set_result(response)
+                return self._follow(cmd, cached, callback, typed)
+            generation = self.cache.generation(self.url)
+
+        self._written(cmd)
+        key = self._read_key(cmd, params, raw)
+        shared = None
+        if key is not None:
+            shared, leader = self._single_flight.join(key)
+            if not leader:
+                return self._follow(cmd, shared, callback, typed)
+
+        def execute_with_callbacks(
+            cmd, params=None, callback=None, raw=False, into=None
+        ):
+            try:
+                code, result = self.send_command(cmd, params, raw, into)
+            except BaseException as e:
+                if shared is not None:
+                    self._single_flight.finish(key, shared, exception=e)
+                raise
+            if generation is not None:
+                response = _copy_params(result)
+                self.cache.update(self.url, cmd, params, code, response, generation)
+            if shared is not None:
+                response = (code, _copy_params(result))
+                self._single_flight.finish(key, shared, response)
+            result = self._typed(cmd, result, typed)
+            if callback:
+                callback(code, result)
+            return code, result
+
         if self.daemon:
-            t = Thread(
-                target=execute_with_callbacks,
-                args=(cmd,),
-                kwargs={"params": params, "callback": callback, "raw": raw},
+            executor = self.executor or get_default_executor()
+
+            def submit(callback=None, timeout=None):
+                try:
+                    return executor.submit(
+                        execute_with_callbacks,
+                        cmd,
+                        params=params,
+                        callback=callback,
+                        raw=raw,
+                        into=into,
+                        timeout=timeout,
+                        priority=command_priority(cmd),
+                        dispatcher=self.dispatcher,
+                        command=cmd,
+                    )
+                except BaseException as e:
+                    if shared is not None:
+                        self._single_flight.finish(key, shared, exception=e)
+                    raise
+
+            future = submit(callback, self.queue_timeout)
+            if shared is not None:
+
+                def cancelled(future):
+                    # Identical commands may still wait for the response.
+                    if future.cancelled() and self._single_flight.abandon(
+                        key, shared
+                    ):
+                        submit()
+
+                future.add_done_callback(cancelled)
+            return future
+        elif self.dispatcher:
+            return self.dispatcher.run(
+                cmd, execute_with_callbacks, cmd, params, callback, raw, into
             )
-            t.daemon = True
-            t.start()
         else:
-            return execute_with_callbacks(cmd, params, callback, raw)
+            return execute_with_callbacks(cmd, params, callback, raw, into)
+
+    def close(self):
+        """
+        Close the idle connections to the camera.
+        """
+        self._pool.close()
+
+    def set_config_if_changed(self, get_cmd, set_cmd, changes):
+        """
+        Read a config group with get_cmd, apply changes and write it back
+        with set_cmd, unless every changed value is already set.
+        Values are compared as strings, as the camera returns them.
+        Return: (result, changed)
+        """
+        response = self.execute_command(get_cmd, typed=False)
+        result, current_config = response.result() if self.daemon else response
+        if result != FOSCAM_SUCCESS:
+            return result, False
+        config = _config_update(current_config, changes)
+        if config is None:
+            return FOSCAM_SUCCESS, False
+        response = self.execute_command(set_cmd, config)
+        result, _ = response.result() if self.daemon else response
+        return result, True
 
     # *************** Network ******************
 
@@ -210,6 +463,62 @@ class FoscamCamera(object):
         params = {"startNo": startno}
         return self.execute_command("getWifiList", params, callback=callback)
 
+    def _wifi_scan_done(self, code, params):
+        return code == FOSCAM_SUCCESS and int(params.get("totalCnt") or 0) > 0
+
+    def scan_wifi(self, timeout=60, delay=1, max_delay=8):
+        """
+        Scan the APs around the camera and return them as WifiAPs.
+        Runs refreshWifiList, then polls getWifiList from delay seconds on,
+        doubling the wait up to max_delay, until the camera lists APs, and
+        reads the other pages in parallel on the executor.
+        Raises FoscamError if the scan fails, or does not list APs within
+        timeout seconds.
+        """
+        result = self.refresh_wifi_list()
+        code, _ = result.result() if self.daemon else result
+        if code != FOSCAM_SUCCESS:
+            raise FoscamError(code)
+        end = monotonic() + timeout
+        while True:
+            sleep(max(min(delay, end - monotonic()), 0))
+            # Sent directly, the dispatcher holds commands while the camera scans.
+            code, params = self.send_command("getWifiList", {"startNo": 0})
+            if self._wifi_scan_done(code, params):
+                break
+            if monotonic() >= end:
+                if code == FOSCAM_SUCCESS:
+                    # No AP in range
+                    break
+                raise FoscamError(ERROR_FOSCAM_TIMEOUT)
+            delay = min(delay * 2, max_delay)
+        if self.dispatcher is not None:
+            self.dispatcher.clear_busy()
+        executor = self.executor or get_default_executor()
+
+        def fetch(startno):
+            if self.daemon:
+                return self.get_wifi_list(startno)
+            return executor.submit(
+                self.get_wifi_list, startno, priority=command_priority("getWifiList")
+            )
+
+        aps = decode_wifi_page(params)
+        total = int(params.get("totalCnt") or 0)
+        # Step by the records of a page, 10, whether or not they hold an AP.
+        step = int(params.get("curCnt") or 0) or 10
+        pages = [fetch(startno) for startno in range(step, total, step)]
+        try:
+            for page in pages:
+                code, params = page.result()
+                if code != FOSCAM_SUCCESS:
+                    raise FoscamError(code)
+                aps.extend(decode_wifi_page(params))
+        finally:
+            for page in pages:
+                page.cancel()
+        return aps
+
     def set_wifi_setting(
         self,
         ssid,
@@ -1030,14 +1339,13 @@ class FoscamCamera(object):
 
     def set_motion_detection(self, enabled=1):
         """
-        Get the current config and set the motion detection on or off
+        Get the current config and set the motion detection on or off,
+        the config is not written if it already has that state
         """
-        result, current_config = self.get_motion_detect_config()
-        if result != FOSCAM_SUCCESS:
-            return result
-        current_config["isEnable"] = enabled
-        self.set_motion_detect_config(current_config)
-        return FOSCAM_SUCCESS
+        result, _ = self.set_config_if_changed(
+            "getMotionDetectConfig", "setMotionDetectConfig", {"isEnable": enabled}
+        )
+        return result
 
     def enable_motion_detection(self):
         """
@@ -1068,13 +1376,13 @@ class FoscamCamera(object):
 
     def set_motion_detection1(self, enabled=1):
         """
-        Get the current config and set the motion detection on or off
+        Get the current config and set the motion detection on or off,
+        the config is not written if it already has that state
         """
-        result, current_config = self.get_motion_detect_config1()
-        if result != FOSCAM_SUCCESS:
-            return result
-        current_config["isEnable"] = enabled
-        self.set_motion_detect_config1(current_config)
+        result, _ = self.set_config_if_changed(
+            "getMotionDetectConfig1", "setMotionDetectConfig1", {"isEnable": enabled}
+        )
+        return result
 
     def enable_motion_detection1(self):
         """
@@ -1232,6 +1540,37 @@ class FoscamCamera(object):
         """
         return self.execute_command("snapPicture2", {}, callback=callback, raw=True)
 
+    def snap_picture_into(self, target, callback=None):
+        """
+        Manually request snapshot, reading the JPEG data straight into
+        target instead of a new bytes object.
+        target: a writable file object, a bytearray or memoryview large
+                enough for the picture, or a SnapshotBufferRing
+        Returns the number of bytes read, or with a SnapshotBufferRing a
+        memoryview of the picture in the ring.
+        Raises BufferError if the picture does not fit a buffer.
+        cmd: snapPicture2
+        """
+        return self.execute_command(
+            "snapPicture2", {}, callback=callback, raw=True, into=target
+        )
+
+    def _stream_connection(self):
+        return self._pool.connect()
+
+    def _stream_path(self):
+        return f"/cgi-bin/CGIStream.cgi?cmd=GetMJStream&usr={self.usr}&pwd={self.pwd}"
+
+    def open_mjpeg_stream(self, ring=None, reconnect_delay=1):
+        """
+        Start reading the MJPEG stream on a background thread, over one
+        connection kept open, into a FrameRing. The sub stream must be
+        MJPEG, see set_sub_stream_format.
+        ring: the FrameRing to fill, by default one of 8 frames of 512 KiB
+        Returns the started MJPEGStreamReader; stop it when done.
+        """
+        return MJPEGStreamReader(self, ring, reconnect_delay).start()
+
     # ******************* SMTP Functions *********************
 
     def set_smtp_config(self, params, callback=None):
@@ -1259,6 +1598,49 @@ class FoscamCamera(object):
         params = {"offset": offset, "count": count}
         return self.execute_command("getLog", params, callback=callback)
 
+    def iter_log(self, since=0, count=10, prefetch=4):
+        """
+        Yield the LogRecords from offset since to the end of the log;
+        resume with since one past the last offset seen. Pages of count
+        records are fetched up to prefetch pages ahead, in parallel on the
+        executor.
+        Raises FoscamError if a page cannot be read.
+        """
+        executor = self.executor or get_default_executor()
+
+        def fetch(offset):
+            if self.daemon:
+                return self.get_log(offset, count)
+            return executor.submit(
+                self.get_log, offset, count, priority=command_priority("getLog")
+            )
+
+        # The log size is only known from the first page, read ahead anyway.
+        pages = deque(
+            (offset, fetch(offset))
+            for offset in range(since, since + prefetch * count, count)
+        )
+        next_offset = since + prefetch * count
+        total = None
+        try:
+            while pages:
+                offset, page = pages.popleft()
+                if total is not None and offset >= total:
+                    page.cancel()
+                    continue
+                code, params = page.result()
+                if code != FOSCAM_SUCCESS:
+                    raise FoscamError(code)
+                total = int(params.get("totalCnt") or 0)
+                while len(pages) < prefetch and next_offset < total:
+                    pages.append((next_offset, fetch(next_offset)))
+                    next_offset += count
+                for record in decode_log_page(params, offset):
+                    yield record
+        finally:
+            for _, page in pages:
+                page.cancel()
+
     def print_ipinfo(self, returncode, params):
         if returncode != FOSCAM_SUCCESS:
             print("Failed to get IPInfo!")
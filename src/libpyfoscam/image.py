@@ -0,0 +1,28 @@
+"""
+Decoding JPEG frames with Pillow
+"""
+
+from io import BytesIO
+
+try:
+    from PIL import Image
+
+    pillow_enabled = True
+except ImportError:
+    Image = None
+    pillow_enabled = False
+
+
+def decode_jpeg(data, mode, size):
+    """
+    Return JPEG data decoded as a PIL image of mode, as small as the
+    decoder can make it while still covering size (width, height), and the
+    (width, height) of the original picture. Requires Pillow.
+    """
+    if not pillow_enabled:
+        raise ImportError("Decoding JPEG frames requires Pillow")
+    image = Image.open(BytesIO(data))
+    original = image.size
+    # Let the JPEG decoder scale down by up to 8 at no cost.
+    image.draft(mode, size)
+    return image.convert(mode), original
@@ -0,0 +1,83 @@
+"""
+Reading JPEG headers without decoding the picture
+"""
+
+from struct import unpack_from
+
+# Start of frame markers, giving the picture size: SOF0 to SOF15 but DHT,
+# JPG and DAC.
+_SOF = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+# Markers without a length: TEM and RST0 to RST7.
+_STANDALONE = frozenset(range(0xD0, 0xD8)) | {0x01}
+_SOS = 0xDA
+_EOI = b"\xff\xd9"
+# Some cameras pad the picture, look for the EOI in its last bytes.
+_EOI_SEARCH = 32
+
+
+class JPEGInfo(object):
+    """
+    What the markers of a JPEG tell: the picture width and height (0 if
+    unknown), whether it starts with SOI and ends with EOI, and its length
+    in bytes up to the EOI, or of all the data without one. valid is true
+    for a complete picture.
+    """
+
+    __slots__ = ("width", "height", "soi", "eoi", "length")
+
+    def __init__(self, width=0, height=0, soi=False, eoi=False, length=0):
+        self.width = width
+        self.height = height
+        self.soi = soi
+        self.eoi = eoi
+        self.length = length
+
+    @property
+    def valid(self):
+        return self.soi and self.eoi and self.width > 0 and self.height > 0
+
+    def __repr__(self):
+        return (
+            f"JPEGInfo(width={self.width}, height={self.height}, soi={self.soi}, "
+            f"eoi={self.eoi}, length={self.length})"
+        )
+
+
+def scan_jpeg(data):
+    """
+    Scan the markers of JPEG data, bytes or any buffer such as a
+    memoryview, up to the start of the compressed picture and return a
+    JPEGInfo. Only the headers and the last bytes are read.
+    """
+    if not isinstance(data, (bytes, bytearray)):
+        data = memoryview(data).cast("B")
+    size = len(data)
+    info = JPEGInfo(length=size)
+    if size < 4 or data[0] != 0xFF or data[1] != 0xD8:
+        return info
+    info.soi = True
+    pos = 2
+    while pos + 4 <= size:
+        if data[pos] != 0xFF:
+            return info
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            # Fill byte
+            pos += 1
+            continue
+        if marker in _STANDALONE:
+            pos += 2
+            continue
+        if marker in _SOF and pos + 9 <= size:
+            info.height, info.width = unpack_from(">HH", data, pos + 5)
+        if marker == _SOS:
+            break
+        pos += 2 + unpack_from(">H", data, pos + 2)[0]
+    else:
+        return info
+    start = max(pos, size - _EOI_SEARCH)
+    end = bytes(data[start:]).rfind(_EOI)
+    if end >= 0:
+        info.eoi = True
+        info.length = start + end + 2
+    return info
@@ -0,0 +1,321 @@
+"""
+Decoding and tailing of the camera log
+"""
+
+import hashlib
+import json
+import os
+import socket
+import sys
+from array import array
+from struct import pack, unpack
+from threading import Lock
+
+LOG_STARTUP = 0
+LOG_MOTION_ALARM = 3
+LOG_LOGIN = 4
+LOG_LOGOUT = 5
+LOG_OFFLINE = 6
+
+
+def _ip_to_int(ip):
+    try:
+        return unpack("!I", socket.inet_aton(ip))[0]
+    except OSError:
+        return 0
+
+
+def _int_to_ip(value):
+    return socket.inet_ntoa(pack("!I", value))
+
+
+class LogRecord(object):
+    """
+    A record of the camera log: its offset in the log, the time as a unix
+    timestamp, the user name, the IPv4 address as int (0 if there is none)
+    and the event type, one of the LOG_ constants.
+
+    Records unpack like (offset, time, user, ip, type) tuples.
+    """
+
+    __slots__ = ("offset", "time", "user", "ip", "type")
+
+    def __init__(self, offset, time, user, ip, type):
+        self.offset = offset
+        self.time = time
+        self.user = user
+        self.ip = ip
+        self.type = type
+
+    @classmethod
+    def parse(cls, offset, text):
+        """
+        Decode a getLog record "time+user+ip+type".
+        """
+        timestamp, _, rest = text.partition("+")
+        user, ip, kind = rest.rsplit("+", 2)
+        user = sys.intern(user)
+        return cls(offset, int(timestamp), user, _ip_to_int(ip), int(kind))
+
+    @property
+    def ip_address(self):
+        return _int_to_ip(self.ip)
+
+    def as_tuple(self):
+        return self.offset, self.time, self.user, self.ip, self.type
+
+    def __iter__(self):
+        return iter(self.as_tuple())
+
+    def __len__(self):
+        return 5
+
+    def __getitem__(self, index):
+        return self.as_tuple()[index]
+
+    def __eq__(self, other):
+        if not isinstance(other, LogRecord):
+            return NotImplemented
+        return self.as_tuple() == other.as_tuple()
+
+    def __repr__(self):
+        return (
+            f"LogRecord(offset={self.offset}, time={self.time}, user={self.user!r}, "
+            f"ip={self.ip_address!r}, type={self.type})"
+        )
+
+
+def decode_log_page(params, offset):
+    """
+    Return the LogRecords of a getLog page read from offset.
+    """
+    records = []
+    for i in range(int(params.get("curCnt") or 0)):
+        text = params.get(f"log{i}")
+        if text:
+            records.append(LogRecord.parse(offset + i, text))
+    return records
+
+
+class LogColumns(object):
+    """
+    Log records of many cameras as compact columns, for filtering and
+    counting without a record object each.
+
+    Columns are arrays: cameras and users hold indexes into the camera
+    and user name lists, ips the IPv4 addresses as int.
+    """
+
+    def __init__(self):
+        self.cameras = array("H")
+        self.offsets = array("I")
+        self.times = array("q")
+        self.users = array("H")
+        self.ips = array("I")
+        self.types = array("B")
+        self.camera_names = []
+        self.user_names = []
+        self._camera_ids = {}
+        self._user_ids = {}
+
+    def __len__(self):
+        return len(self.times)
+
+    def _id(self, ids, names, name):
+        index = ids.get(name)
+        if index is None:
+            index = ids[name] = len(names)
+            names.append(name)
+        return index
+
+    def extend(self, records, camera=None):
+        """
+        Append LogRecords of camera, a name.
+        """
+        camera_id = self._id(self._camera_ids, self.camera_names, camera)
+        user_ids, user_names = self._user_ids, self.user_names
+        for record in records:
+            self.cameras.append(camera_id)
+            self.offsets.append(record.offset)
+            self.times.append(record.time)
+            self.users.append(self._id(user_ids, user_names, record.user))
+            self.ips.append(record.ip)
+            self.types.append(record.type)
+
+    def extend_page(self, params, offset, camera=None):
+        """
+        Append the records of a getLog page read from offset.
+        """
+        self.extend(decode_log_page(params, offset), camera)
+
+    def record(self, index):
+        """
+        Return (camera, LogRecord) of the record at index.
+        """
+        record = LogRecord(
+            self.offsets[index],
+            self.times[index],
+            self.user_names[self.users[index]],
+            self.ips[index],
+            self.types[index],
+        )
+        return self.camera_names[self.cameras[index]], record
+
+    def select(self, types=None, start=None, end=None, camera=None):
+        """
+        Return the indexes of the records of the given types, from time
+        start to end included, of camera.
+        """
+        types = set(types) if types is not None else None
+        camera_id = self._camera_ids.get(camera, -1) if camera is not None else None
+        return [
+            index
+            for index, (timestamp, kind, cam) in enumerate(
+                zip(self.times, self.types, self.cameras)
+            )
+            if (types is None or kind in types)
+            and (start is None or timestamp >= start)
+            and (end is None or timestamp <= end)
+            and (camera_id is None or cam == camera_id)
+        ]
+
+    def count_types(self):
+        """
+        Return a dict of event types to their number of records.
+        """
+        counts = [0] * 256
+        for kind in self.types:
+            counts[kind] += 1
+        return {kind: count for kind, count in enumerate(counts) if count}
+
+
+def _digest(record):
+    text = f"{record.time}+{record.user}+{record.ip_address}+{record.type}"
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+class LogTailer(object):
+    """
+    Read only the new records of the camera logs on each poll.
+
+    The cursor of each camera, the offset after its last record read and
+    a hash of that record, is kept in the JSON file path across runs.
+    A poll first reads the page holding the last record read: if it is
+    still there, the records after it are new. Otherwise, as a full log
+    drops its oldest records, offsets shift down: the log is paged back
+    from there to the last record read, and the records after it are new,
+    or all if it is gone (a reset). If the log got shorter than the cursor,
+    it is read again whole, and the records after the last record read
+    are new, or all if it was cleared (also a reset).
+    """
+
+    def __init__(self, path, prefetch=2, count=10):
+        self.path = path
+        self.prefetch = prefetch
+        self.count = count
+        self.resets = {}
+        self._cursors = {}
+        self._lock = Lock()
+        if os.path.exists(path):
+            with open(path, "r") as file:
+                self._cursors = json.load(file)
+
+    def cursor(self, name):
+        """
+        Return (offset, hash) of camera name, or (0, None).
+        """
+        with self._lock:
+            cursor = self._cursors.get(name)
+        if cursor is None:
+            return 0, None
+        return cursor["offset"], cursor["hash"]
+
+    def _reset(self, name):
+        with self._lock:
+            self.resets[name] = self.resets.get(name, 0) + 1
+
+    def _page_back(self, camera, end, digest):
+        """
+        Page the log back from offset end to the record with digest.
+        Return (found, records): the records after it up to end, or all
+        the records before end if it is not found.
+        """
+        # Imported here, foscam imports this module.
+        from libpyfoscam.foscam import FOSCAM_SUCCESS, FoscamError
+
+        after = []
+        while end > 0:
+            start = max(end - self.count, 0)
+            response = camera.get_log(start, end - start)
+            code, params = response.result() if camera.daemon else response
+            if code != FOSCAM_SUCCESS:
+                raise FoscamError(code)
+            page = decode_log_page(params, start)
+            for index in range(len(page) - 1, -1, -1):
+                if _digest(page[index]) == digest:
+                    return True, page[index + 1 :] + after
+            after = page + after
+            end = start
+        return False, after
+
+    def _read(self, name, camera):
+        offset, digest = self.cursor(name)
+        if offset:
+            records = list(camera.iter_log(offset - 1, prefetch=self.prefetch))
+            if records:
+                if _digest(records[0]) == digest:
+                    return records[1:]
+                found, earlier = self._page_back(camera, offset - 1, digest)
+                if not found:
+                    self._reset(name)
+                return earlier + records
+        records = list(camera.iter_log(prefetch=self.prefetch))
+        if digest is not None:
+            for index in range(len(records) - 1, -1, -1):
+                if _digest(records[index]) == digest:
+                    return records[index + 1 :]
+            self._reset(name)
+        return records
+
+    def poll(self, name, camera, save=True):
+        """
+        Return the new LogRecords of camera name and move its cursor past
+        them.
+        Raises FoscamError if the log cannot be read.
+        """
+        records = self._read(name, camera)
+        if records:
+            last = records[-1]
+            with self._lock:
+                self._cursors[name] = {"offset": last.offset + 1, "hash": _digest(last)}
+            if save:
+                self.save()
+        return records
+
+    def poll_fleet(self, fleet, names=None):
+        """
+        Poll the cameras of a FoscamFleet in parallel and return a dict of
+        camera names to new records; a poll raising an exception has the
+        exception as its result.
+        """
+        futures = {
+            name: fleet.executor.submit(self.poll, name, camera, False)
+            for name, camera in fleet.select(names)
+        }
+        results = {}
+        for name, future in futures.items():
+            error = future.exception()
+            results[name] = future.result() if error is None else error
+        self.save()
+        return results
+
+    def save(self):
+        """
+        Write the cursors to the state file, replacing it at once.
+        """
+        with self._lock:
+            data = json.dumps(self._cursors, indent=4)
+            temporary = f"{self.path}.tmp"
+            with open(temporary, "w") as file:
+                file.write(data)
+            os.replace(temporary, self.path)
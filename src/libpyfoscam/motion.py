@@ -0,0 +1,227 @@
+"""
+Motion detection on the host, over frames taken from the cameras
+"""
+
+from threading import Lock
+from time import time
+
+from libpyfoscam.foscam import FOSCAM_SUCCESS
+from libpyfoscam.image import Image, decode_jpeg
+
+try:
+    import numpy as np
+
+    numpy_enabled = True
+except ImportError:
+    numpy_enabled = False
+
+
+class MotionEvent(object):
+    """
+    Motion seen by a camera: the fraction of changed pixels as score and
+    the bounding regions of the changes as (x, y, width, height) in pixels
+    of the original frame.
+    """
+
+    __slots__ = ("name", "timestamp", "score", "regions")
+
+    def __init__(self, name, timestamp, score, regions):
+        self.name = name
+        self.timestamp = timestamp
+        self.score = score
+        self.regions = regions
+
+    def __repr__(self):
+        return (
+            f"MotionEvent(name={self.name!r}, timestamp={self.timestamp!r}, "
+            f"score={self.score:.3f}, regions={self.regions!r})"
+        )
+
+
+def _components(active):
+    """
+    Return the bounding boxes (row, col, rows, cols) of the groups of
+    neighbouring true cells of a small 2D boolean array.
+    """
+    rows, cols = active.shape
+    seen = set()
+    boxes = []
+    for start in map(tuple, np.argwhere(active)):
+        if start in seen:
+            continue
+        seen.add(start)
+        stack = [start]
+        top, left, bottom, right = start[0], start[1], start[0], start[1]
+        while stack:
+            row, col = stack.pop()
+            top, bottom = min(top, row), max(bottom, row)
+            left, right = min(left, col), max(right, col)
+            for r in range(max(row - 1, 0), min(row + 2, rows)):
+                for c in range(max(col - 1, 0), min(col + 2, cols)):
+                    if active[r, c] and (r, c) not in seen:
+                        seen.add((r, c))
+                        stack.append((r, c))
+        boxes.append((top, left, bottom - top + 1, right - left + 1))
+    return boxes
+
+
+class MotionDetector(object):
+    """
+    Frame differencing against a running average background of one camera.
+
+    Frames are reduced to about size (width, height) grey pixels first:
+    JPEG data is decoded with Pillow at reduced scale, arrays as decoded
+    by the caller (grey or RGB) are subsampled. A pixel changed if it
+    differs from the background by more than threshold grey levels; the
+    background follows the frames at rate alpha. Changes are gathered in
+    cells of cell pixels; cells with at least cell_fraction changed
+    pixels make up the regions. Frames with less than min_score changed
+    pixels are no motion.
+
+    Requires NumPy, and Pillow for JPEG frames. Frames fed at once are
+    decoded in parallel but compared to the background one at a time.
+    """
+
+    def __init__(
+        self,
+        size=(80, 60),
+        threshold=25,
+        alpha=0.05,
+        cell=5,
+        cell_fraction=0.3,
+        min_score=0.01,
+    ):
+        if not numpy_enabled:
+            raise ImportError("Motion detection requires NumPy")
+        self.size = size
+        self.threshold = threshold
+        self.alpha = alpha
+        self.cell = cell
+        self.cell_fraction = cell_fraction
+        self.min_score = min_score
+        self.background = None
+        self._delta = None
+        self._diff = None
+        self._mask = None
+        self._lock = Lock()
+
+    def _grey(self, frame):
+        """
+        Return the reduced grey frame as float32 array and the (x, y) scale
+        from its pixels to those of the original frame.
+        """
+        if isinstance(frame, (bytes, bytearray, memoryview)):
+            image, (width, height) = decode_jpeg(frame, "L", self.size)
+            if image.size != self.size:
+                image = image.resize(self.size, Image.BILINEAR)
+            scale = (width / image.size[0], height / image.size[1])
+            return np.asarray(image, dtype=np.float32), scale
+        array = np.asarray(frame)
+        height, width = array.shape[:2]
+        factor = max(1, min(width // self.size[0], height // self.size[1]))
+        if factor > 1:
+            array = array[::factor, ::factor]
+        if array.ndim == 3:
+            array = array.mean(axis=2, dtype=np.float32)
+        return array.astype(np.float32, copy=False), (factor, factor)
+
+    def feed(self, frame):
+        """
+        Return (score, regions) for the frame, or None if it shows no motion.
+        """
+        grey, (scale_x, scale_y) = self._grey(frame)
+        with self._lock:
+            if self.background is None or self.background.shape != grey.shape:
+                self.background = grey.copy()
+                self._delta = np.empty_like(grey)
+                self._diff = np.empty_like(grey)
+                self._mask = np.empty(grey.shape, dtype=bool)
+                return None
+            delta, diff, mask = self._delta, self._diff, self._mask
+            np.subtract(grey, self.background, out=delta)
+            np.abs(delta, out=diff)
+            np.greater(diff, self.threshold, out=mask)
+            delta *= self.alpha
+            self.background += delta
+            score = float(np.count_nonzero(mask)) / mask.size
+            if score < self.min_score:
+                return None
+            cell = self.cell
+            rows, cols = mask.shape[0] // cell, mask.shape[1] // cell
+            counts = (
+                mask[: rows * cell, : cols * cell]
+                .reshape(rows, cell, cols, cell)
+                .sum(axis=(1, 3))
+            )
+            active = counts >= cell * cell * self.cell_fraction
+            if not active.any():
+                return None
+            scale_x *= cell
+            scale_y *= cell
+            regions = [
+                (
+                    int(left * scale_x),
+                    int(top * scale_y),
+                    int(cols * scale_x),
+                    int(rows * scale_y),
+                )
+                for top, left, rows, cols in _components(active)
+            ]
+            return score, regions
+
+
+class MotionAnalyzer(object):
+    """
+    Motion detection over many cameras, with a MotionDetector per camera
+    made with the given keyword arguments. Motion events are returned and
+    passed to on_event(event) if given.
+
+    An analyzer can be the handler of a SnapshotScheduler, and can poll
+    the FrameRing of an MJPEGStreamReader.
+    """
+
+    def __init__(self, on_event=None, **kwargs):
+        if not numpy_enabled:
+            raise ImportError("Motion detection requires NumPy")
+        self.on_event = on_event
+        self.kwargs = kwargs
+        self._detectors = {}
+        self._sequences = {}
+        self._lock = Lock()
+
+    def detector(self, name):
+        with self._lock:
+            detector = self._detectors.get(name)
+            if detector is None:
+                detector = self._detectors[name] = MotionDetector(**self.kwargs)
+            return detector
+
+    def feed(self, name, frame, timestamp=None):
+        """
+        Analyze a frame of camera name: JPEG data or a decoded array.
+        Returns the MotionEvent, or None.
+        """
+        result = self.detector(name).feed(frame)
+        if result is None:
+            return None
+        event = MotionEvent(name, timestamp or time(), *result)
+        if self.on_event is not None:
+            self.on_event(event)
+        return event
+
+    def __call__(self, name, rc, data, timestamp=None):
+        if rc == FOSCAM_SUCCESS and data:
+            return self.feed(name, data, timestamp)
+        return None
+
+    def poll(self, name, ring):
+        """
+        Analyze the newest frame of a FrameRing, if not seen yet; frames in
+        between are skipped. Returns the MotionEvent, or None.
+        """
+        latest = ring.latest()
+        if latest is None or self._sequences.get(name) == latest[0]:
+            return None
+        sequence, timestamp, frame = latest
+        self._sequences[name] = sequence
+        return self.feed(name, frame, timestamp)
@@ -0,0 +1,81 @@
+"""
+Parsing of CGI responses
+"""
+
+import codecs
+import re
+from collections import OrderedDict
+from html import unescape
+from urllib.parse import unquote_to_bytes
+
+# CGI results are a flat list of elements holding text.
+_ELEMENT = re.compile(r"<(\w+)>([^<]*)</\1>|<(\w+)\s*/>")
+_ROOT = "<CGI_Result>"
+
+
+class CGIResultParser(object):
+    """
+    An incremental parser of CGI_Result responses.
+
+    Feed the body in chunks as it arrives, then close to get the
+    (code, params) pair. Elements are decoded in one pass without
+    building a tree, as ET.fromstring would. Raises ValueError on close
+    if the body is not a CGI result.
+    """
+
+    def __init__(self):
+        self.code = None
+        self.params = OrderedDict()
+        self._decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        self._buffer = ""
+        self._root = False
+
+    def feed(self, data):
+        buffer = self._buffer + self._decoder.decode(data)
+        start = 0
+        if not self._root:
+            start = buffer.find(_ROOT)
+            if start < 0:
+                self._buffer = buffer[-len(_ROOT) :]
+                return
+            self._root = True
+            start += len(_ROOT)
+        # Only parse up to the end of the last complete closing tag.
+        closing = buffer.rfind("</", start)
+        end = buffer.find(">", closing) + 1 if closing >= 0 else 0
+        if not end:
+            self._buffer = buffer[start:]
+            return
+        self._buffer = buffer[end:]
+        params = self.params
+        for tag, text, empty in _ELEMENT.findall(buffer, start, end):
+            if empty:
+                params[empty] = None
+            elif tag == "result":
+                self.code = int(text)
+            elif text:
+                if "&" in text:
+                    text = unescape(text)
+                if "%" in text:
+                    text = unquote_to_bytes(text).decode("utf-8", "replace")
+                params[tag] = text
+            else:
+                params[tag] = None
+
+    def close(self):
+        """
+        Return the parsed (code, params); code is None if there was none.
+        """
+        self.feed(b"")
+        if not self._root:
+            raise ValueError("Not a CGI result")
+        return self.code, self.params
+
+
+def parse_cgi_result(data):
+    """
+    Parse a complete CGI_Result body into (code, params).
+    """
+    parser = CGIResultParser()
+    parser.feed(data)
+    return parser.close()
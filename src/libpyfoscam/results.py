@@ -0,0 +1,218 @@
+"""
+Typed results of common CGI commands
+"""
+
+from collections import OrderedDict
+
+
+def _to_int(value):
+    if value is None or value == "":
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+class CGIResult(object):
+    """
+    Base of compact command results with typed attributes.
+
+    Fields listed in int_fields are converted to int, str_fields are kept
+    as strings, missing fields are None. Parameters the class does not
+    know are kept in extra. Results can be read like the dict results,
+    e.g. result["ip"], with only the parameters the camera sent as keys,
+    and as_dict returns the dict form with the known fields first.
+    """
+
+    __slots__ = ("extra", "_present")
+    cmd = None
+    int_fields = ()
+    str_fields = ()
+
+    @classmethod
+    def from_params(cls, params):
+        result = cls.__new__(cls)
+        # A bit per known field, in int_fields + str_fields order.
+        present = 0
+        bit = 1
+        for name in cls.int_fields:
+            if name in params:
+                present |= bit
+            setattr(result, name, _to_int(params.get(name)))
+            bit <<= 1
+        for name in cls.str_fields:
+            if name in params:
+                present |= bit
+            setattr(result, name, params.get(name))
+            bit <<= 1
+        extra = None
+        for name in params:
+            if name not in cls.int_fields and name not in cls.str_fields:
+                if extra is None:
+                    extra = {}
+                extra[name] = params[name]
+        result.extra = extra
+        result._present = present
+        return result
+
+    def keys(self):
+        present = self._present
+        keys = [
+            name
+            for i, name in enumerate(self.int_fields + self.str_fields)
+            if present >> i & 1
+        ]
+        if self.extra:
+            keys.extend(self.extra)
+        return keys
+
+    def __getitem__(self, name):
+        if self.extra and name in self.extra:
+            return self.extra[name]
+        if name in self.keys():
+            return getattr(self, name)
+        raise KeyError(name)
+
+    def get(self, name, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+    def __contains__(self, name):
+        return name in self.keys()
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __eq__(self, other):
+        if not isinstance(other, CGIResult):
+            return NotImplemented
+        return type(self) is type(other) and self.as_dict() == other.as_dict()
+
+    def as_dict(self):
+        """
+        Return the parameters as the camera sent them, as strings.
+        """
+        params = OrderedDict()
+        for name in self.keys():
+            value = self[name]
+            params[name] = str(value) if value is not None else None
+        return params
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={self[name]!r}" for name in self.keys())
+        return f"{type(self).__name__}({fields})"
+
+
+class DevState(CGIResult):
+    cmd = "getDevState"
+    int_fields = (
+        "IOState",
+        "motionDetectAlarm",
+        "soundAlarm",
+        "record",
+        "sdState",
+        "ntpState",
+        "ddnsState",
+        "upnpState",
+        "isWifiConnected",
+        "infraLedState",
+    )
+    str_fields = ("sdFreeSpace", "sdTotalSpace", "url", "wifiConnectedAP")
+    __slots__ = int_fields + str_fields
+
+
+class IPInfo(CGIResult):
+    cmd = "getIPInfo"
+    int_fields = ("isDHCP",)
+    str_fields = ("ip", "gate", "mask", "dns1", "dns2")
+    __slots__ = int_fields + str_fields
+
+
+class PortInfo(CGIResult):
+    cmd = "getPortInfo"
+    int_fields = ("webPort", "mediaPort", "httpsPort", "onvifPort", "rtspPort")
+    __slots__ = int_fields
+
+
+class DevInfo(CGIResult):
+    cmd = "getDevInfo"
+    int_fields = ("year", "mon", "day", "hour", "min", "sec", "timeZone")
+    str_fields = (
+        "productName",
+        "serialNo",
+        "devName",
+        "mac",
+        "firmwareVer",
+        "hardwareVer",
+    )
+    __slots__ = int_fields + str_fields
+
+
+class VideoStreamParam(CGIResult):
+    cmd = "getVideoStreamParam"
+    int_fields = tuple(
+        f"{name}{stream}"
+        for stream in range(4)
+        for name in ("resolution", "bitRate", "frameRate", "GOP", "isVBR")
+    )
+    __slots__ = int_fields
+
+
+class MotionDetectConfig(CGIResult):
+    cmd = "getMotionDetectConfig"
+    int_fields = (
+        "isEnable",
+        "linkage",
+        "snapInterval",
+        "sensitivity",
+        "triggerInterval",
+        "isMovAlarmEnable",
+        "isPirAlarmEnable",
+    ) + tuple(f"schedule{day}" for day in range(7)) + tuple(
+        f"area{row}" for row in range(10)
+    )
+    __slots__ = int_fields
+
+
+class MirrorAndFlipSetting(CGIResult):
+    cmd = "getMirrorAndFlipSetting"
+    int_fields = ("isMirror", "isFlip")
+    __slots__ = int_fields
+
+
+class InfraLedConfig(CGIResult):
+    cmd = "getInfraLedConfig"
+    int_fields = ("mode",)
+    __slots__ = int_fields
+
+
+RESULT_TYPES = {
+    cls.cmd: cls
+    for cls in (
+        DevState,
+        IPInfo,
+        PortInfo,
+        DevInfo,
+        VideoStreamParam,
+        MotionDetectConfig,
+        MirrorAndFlipSetting,
+        InfraLedConfig,
+    )
+}
+
+
+def typed_result(cmd, params):
+    """
+    Return the typed result of cmd for its params, or params itself if
+    the command has no result type.
+    """
+    cls = RESULT_TYPES.get(cmd)
+    if cls is None or params is None or isinstance(params, CGIResult):
+        return params
+    return cls.from_params(params)
@@ -0,0 +1,150 @@
+"""
+Taking snapshots of many cameras at a steady rate
+"""
+
+import heapq
+from random import uniform
+from threading import Event, Lock, Thread
+from time import monotonic, time
+
+from libpyfoscam.foscam import FOSCAM_SUCCESS
+
+
+class _CameraSchedule(object):
+    def __init__(self, name, camera, fps, offset):
+        self.name = name
+        self.camera = camera
+        self.fps = fps
+        self.period = 1.0 / fps
+        self.offset = offset
+        self.slot = 0
+        self.busy = False
+        self.captured = 0
+        self.failed = 0
+        self.skipped = 0
+
+
+class SnapshotScheduler(object):
+    """
+    Take snapshots of the cameras of a FoscamFleet, each at its target rate.
+
+    Capture slots of the cameras are spread evenly over a period, each
+    slot moved by up to jitter periods at random, so requests do not
+    bunch up. Slots follow a fixed grid and do not drift. A slot is
+    skipped, not queued, when the previous snapshot of the camera is
+    still running or being handled, or the slot was missed altogether.
+
+    Snapshots run on the fleet executor and are passed to
+    handler(name, rc, data, timestamp) as they complete, one at a time
+    per camera.
+    fps: the target rate, the same for all cameras or a dict of camera
+         names to rates
+    """
+
+    def __init__(self, fleet, handler, fps=1.0, jitter=0.1, names=None):
+        self.fleet = fleet
+        self.handler = handler
+        self.jitter = jitter
+        cameras = fleet.select(names)
+        self._schedules = {}
+        for index, (name, camera) in enumerate(cameras):
+            rate = fps.get(name) if isinstance(fps, dict) else fps
+            if rate:
+                offset = index / len(cameras) / rate
+                self._schedules[name] = _CameraSchedule(name, camera, rate, offset)
+        self._lock = Lock()
+        self._stop = Event()
+        self._thread = None
+        self._started = None
+        self._stopped = None
+
+    def start(self):
+        self._stop.clear()
+        self._stopped = None
+        self._thread = Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._stopped = monotonic()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _due(self, schedule):
+        slot_time = self._started + schedule.offset + schedule.slot * schedule.period
+        return slot_time + uniform(-self.jitter, self.jitter) * schedule.period
+
+    def _run(self):
+        self._started = monotonic()
+        heap = [(self._due(s), name) for name, s in self._schedules.items()]
+        heapq.heapify(heap)
+        while heap and not self._stop.is_set():
+            due, name = heap[0]
+            delay = due - monotonic()
+            if delay > 0:
+                self._stop.wait(delay)
+                continue
+            schedule = self._schedules[name]
+            # Skip the slots missed while behind, keeping to the grid.
+            late = int(-delay / schedule.period)
+            with self._lock:
+                schedule.skipped += late
+                if schedule.busy:
+                    schedule.skipped += 1
+                else:
+                    schedule.busy = True
+                    self._submit(schedule)
+            schedule.slot += late + 1
+            heapq.heapreplace(heap, (self._due(schedule), name))
+
+    def _submit(self, schedule):
+        try:
+            self.fleet.executor.submit(self._snap, schedule)
+        except RuntimeError:
+            schedule.busy = False
+
+    def _snap(self, schedule):
+        try:
+            rc, data = schedule.camera.snap_picture_2()
+        except Exception:
+            rc, data = None, None
+        with self._lock:
+            if rc == FOSCAM_SUCCESS:
+                schedule.captured += 1
+            else:
+                schedule.failed += 1
+        try:
+            self.handler(schedule.name, rc, data, time())
+        finally:
+            # Only now, so the handler gets the snapshots of a camera one
+            # at a time and in order.
+            with self._lock:
+                schedule.busy = False
+
+    def stats(self):
+        """
+        Return a dict of camera names to dicts of target_fps, achieved_fps
+        and the captured, failed and skipped snapshot counts.
+        """
+        elapsed = 0
+        if self._started is not None:
+            elapsed = (self._stopped or monotonic()) - self._started
+        stats = {}
+        with self._lock:
+            for name, schedule in self._schedules.items():
+                stats[name] = {
+                    "target_fps": schedule.fps,
+                    "achieved_fps": schedule.captured / elapsed if elapsed else 0.0,
+                    "captured": schedule.captured,
+                    "failed": schedule.failed,
+                    "skipped": schedule.skipped,
+                }
+        return stats
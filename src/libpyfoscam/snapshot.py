@@ -0,0 +1,78 @@
+"""
+Reading snapshots into preallocated buffers
+"""
+
+from threading import Lock
+
+
+class SnapshotBufferRing(object):
+    """
+    A fixed ring of count preallocated buffers of size bytes each.
+
+    Snapshots taken into the ring reuse the buffers in turn, so steady
+    capture allocates no memory for the pictures. A picture stays valid
+    until count more snapshots were taken into the ring.
+    """
+
+    def __init__(self, count=4, size=512 * 1024):
+        self._views = [memoryview(bytearray(size)) for _ in range(count)]
+        self._next = 0
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._views)
+
+    def next(self):
+        """
+        Return the next buffer of the ring, as a memoryview.
+        """
+        with self._lock:
+            view = self._views[self._next]
+            self._next = (self._next + 1) % len(self._views)
+        return view
+
+
+def read_into(response, target, scratch):
+    """
+    Read the body of an http.client.HTTPResponse into target without
+    building a bytes object and return the number of bytes read.
+    target is a writable file object, copied to through the scratch
+    memoryview, or a writable buffer such as a bytearray or memoryview.
+    Raises BufferError if the body does not fit the buffer.
+    """
+    total = 0
+    if hasattr(target, "write"):
+        while True:
+            size = response.readinto(scratch)
+            if not size:
+                return total
+            target.write(scratch[:size])
+            total += size
+    view = memoryview(target).cast("B")
+    while total < len(view):
+        size = response.readinto(view[total:])
+        if not size:
+            return total
+        total += size
+    if response.read(1):
+        raise BufferError("Snapshot does not fit the buffer")
+    return total
+
+
+def write_into(data, target):
+    """
+    Copy a picture read as bytes into target, as read_into would, except
+    that with a SnapshotBufferRing a memoryview of the picture in the
+    ring is returned.
+    """
+    if isinstance(target, SnapshotBufferRing):
+        view = target.next()
+        return view[: write_into(data, view)]
+    if hasattr(target, "write"):
+        target.write(data)
+        return len(data)
+    view = memoryview(target).cast("B")
+    if len(data) > len(view):
+        raise BufferError("Snapshot does not fit the buffer")
+    view[: len(data)] = data
+    return len(data)
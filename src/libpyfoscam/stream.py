@@ -0,0 +1,227 @@
+"""
+Reading the MJPEG stream of a camera
+"""
+
+from threading import Event, Thread
+from time import time
+
+
+class FrameRing(object):
+    """
+    A fixed ring of count preallocated frame buffers of size bytes each.
+
+    One writer fills the ring, frame after frame, overwriting the oldest.
+    Readers take no lock: a frame is copied out, then checked not to have
+    been overwritten meanwhile, in which case it is reported as missing.
+    """
+
+    def __init__(self, count=8, size=512 * 1024):
+        self.count = count
+        self.size = size
+        self._views = [memoryview(bytearray(size)) for _ in range(count)]
+        self._lengths = [0] * count
+        self._stamps = [0.0] * count
+        self._sequences = [-1] * count
+        # Number of frames written so far.
+        self.sequence = 0
+
+    def reserve(self):
+        """
+        Return the buffer to write the next frame into. The frame it held
+        is no longer readable.
+        """
+        index = self.sequence % self.count
+        self._sequences[index] = -1
+        return self._views[index]
+
+    def commit(self, length, stamp=None):
+        """
+        Publish the frame of length bytes written into the reserved buffer.
+        """
+        sequence = self.sequence
+        index = sequence % self.count
+        self._lengths[index] = length
+        self._stamps[index] = time() if stamp is None else stamp
+        self._sequences[index] = sequence
+        self.sequence = sequence + 1
+
+    def read(self, sequence, out=None):
+        """
+        Return (timestamp, frame) of the frame numbered sequence, or None if
+        it was not written yet or was overwritten. The frame is copied into
+        the writable buffer out if given, and the number of bytes copied
+        returned in place of the frame.
+        """
+        index = sequence % self.count
+        if self._sequences[index] != sequence:
+            return None
+        length = self._lengths[index]
+        stamp = self._stamps[index]
+        view = self._views[index][:length]
+        if out is None:
+            frame = bytes(view)
+        else:
+            memoryview(out).cast("B")[:length] = view
+            frame = length
+        if self._sequences[index] != sequence:
+            return None
+        return stamp, frame
+
+    def latest(self, out=None):
+        """
+        Return (sequence, timestamp, frame) of the newest frame, or None.
+        With a count of 1, that is None while the next frame is written.
+        """
+        written = self.sequence
+        while written:
+            frame = self.read(written - 1, out)
+            if frame is not None:
+                return (written - 1,) + frame
+            if self.sequence == written:
+                # Only with a count of 1: its buffer is reserved for the
+                # next frame, which never comes if the stream broke.
+                return None
+            written = self.sequence
+        return None
+
+
+class MJPEGStreamReader(object):
+    """
+    Keep the MJPEG stream of a camera open on a background thread and push
+    its frames into a FrameRing, reconnecting after reconnect_delay
+    seconds when the stream breaks.
+
+    The camera must stream its sub stream as MJPEG, see
+    FoscamCamera.set_sub_stream_format.
+    """
+
+    def __init__(self, camera, ring=None, reconnect_delay=1):
+        self.camera = camera
+        self.ring = ring if ring is not None else FrameRing()
+        self.reconnect_delay = reconnect_delay
+        self.dropped = 0
+        self.error = None
+        self._stop = Event()
+        self._conn = None
+        self._thread = None
+        self._at_part = False
+
+    def start(self):
+        self._stop.clear()
+        self._thread = Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        conn = self._conn
+        if conn is not None:
+            conn.close()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self._read_stream()
+            except Exception as e:
+                self.error = e
+                if self.camera.verbose:
+                    print(f"Foscam stream exception: {e}")
+            self._stop.wait(self.reconnect_delay)
+
+    def _read_stream(self):
+        self._conn = conn = self.camera._stream_connection()
+        try:
+            conn.request("GET", self.camera._stream_path())
+            response = conn.getresponse()
+            if response.status != 200:
+                raise OSError(f"HTTP {response.status} {response.reason}")
+            content_type = response.getheader("Content-Type", "")
+            boundary = content_type.partition("boundary=")[2].strip().strip('"')
+            boundary = b"--" + boundary.encode().lstrip(b"-")
+            self._at_part = False
+            while not self._stop.is_set():
+                if not self._read_frame(response, boundary):
+                    return
+        finally:
+            self._conn = None
+            conn.close()
+
+    def _read_frame(self, response, boundary):
+        """
+        Read one part of the multipart stream into the ring.
+        Return False at the end of the stream.
+        """
+        if not self._at_part:
+            line = response.readline()
+            while line and not line.startswith(boundary):
+                line = response.readline()
+            if not line or line.rstrip().endswith(b"--"):
+                return False
+        self._at_part = False
+        length = None
+        line = response.readline()
+        while line.strip():
+            name, _, value = line.partition(b":")
+            if name.strip().lower() == b"content-length":
+                length = int(value)
+            line = response.readline()
+        if not line:
+            return False
+        ring = self.ring
+        if length is None:
+            return self._read_unsized_frame(response, boundary)
+        if length > ring.size:
+            self.dropped += 1
+            while length:
+                chunk = response.read(min(length, 64 * 1024))
+                if not chunk:
+                    return False
+                length -= len(chunk)
+            return True
+        view = ring.reserve()
+        received = 0
+        while received < length:
+            size = response.readinto(view[received:length])
+            if not size:
+                return False
+            received += size
+        ring.commit(length)
+        return True
+
+    def _read_unsized_frame(self, response, boundary):
+        """
+        Read a part without Content-Length, up to and including the next
+        boundary line.
+        """
+        ring = self.ring
+        view = ring.reserve()
+        length = 0
+        while True:
+            line = response.readline()
+            if not line:
+                return False
+            if line.startswith(boundary):
+                break
+            if length + len(line) <= ring.size:
+                view[length : length + len(line)] = line
+            length += len(line)
+        if length > ring.size:
+            self.dropped += 1
+        else:
+            # The line break before the boundary is not part of the frame.
+            if view[length - 2 : length] == b"\r\n":
+                length -= 2
+            ring.commit(length)
+        if line.rstrip().endswith(b"--"):
+            return False
+        self._at_part = True
+        return True
@@ -0,0 +1,225 @@
+"""
+Building timelapses from snapshots of the cameras
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from struct import Struct
+from threading import Lock
+from time import localtime, strftime
+
+from libpyfoscam.foscam import FOSCAM_SUCCESS
+from libpyfoscam.image import decode_jpeg, pillow_enabled
+from libpyfoscam.scheduler import SnapshotScheduler
+
+# An index entry: the time, offset and length of a frame.
+_ENTRY = Struct("<dQI")
+
+
+def downsample(data, size=(640, 360), quality=75):
+    """
+    Return JPEG data scaled down to fit size (width, height), or data as is
+    without Pillow.
+    """
+    if not pillow_enabled:
+        return data
+    image, _ = decode_jpeg(data, "RGB", size)
+    image.thumbnail(size)
+    output = BytesIO()
+    image.save(output, "JPEG", quality=quality)
+    return output.getvalue()
+
+
+def read_index(path):
+    """
+    Return the (timestamp, offset, length) entries of the frames of a
+    timelapse file.
+    """
+    with open(path + ".idx", "rb") as f:
+        return list(_ENTRY.iter_unpack(f.read()))
+
+
+class TimelapseWriter(object):
+    """
+    Append JPEG frames to a file, one after the other, which plays as MJPEG,
+    and their time, offset and length to the index file path + ".idx".
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "ab")
+        self._index = open(path + ".idx", "ab")
+        self._size = os.fstat(self._file.fileno()).st_size
+        self._lock = Lock()
+
+    def append(self, data, timestamp):
+        with self._lock:
+            self._file.write(data)
+            self._file.flush()
+            self._index.write(_ENTRY.pack(timestamp, self._size, len(data)))
+            self._index.flush()
+            self._size += len(data)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+            self._index.close()
+
+
+class TimelapseBuilder(object):
+    """
+    Build a timelapse per camera of a FoscamFleet and per day, as
+    directory/<camera>/<YYYY-MM-DD>.mjpeg with its index, from a snapshot
+    taken every interval seconds and scaled down to fit size.
+
+    The frames of all cameras are scaled by one shared pool of workers
+    threads, or the given executor. Memory stays bounded: a snapshot
+    arriving while max_pending frames wait for a worker is dropped. frames,
+    dropped and failed count the frames added, dropped and not decoded.
+
+    Once stopped, the builder takes no more frames: those still queued in
+    a given executor are dropped.
+    """
+
+    def __init__(
+        self,
+        fleet,
+        directory,
+        interval=60,
+        size=(640, 360),
+        quality=75,
+        workers=4,
+        executor=None,
+        max_pending=None,
+        names=None,
+    ):
+        self.fleet = fleet
+        self.directory = directory
+        self.interval = interval
+        self.size = size
+        self.quality = quality
+        self.max_pending = max_pending or workers * 2
+        self.names = names
+        self.frames = 0
+        self.dropped = 0
+        self.failed = 0
+        self._executor = executor or ThreadPoolExecutor(workers)
+        self._own_executor = executor is None
+        self._writers = {}
+        # Workers appending to each writer, and the writers to close once
+        # they are done.
+        self._users = {}
+        self._retired = set()
+        self._pending = 0
+        self._stopped = False
+        self._lock = Lock()
+        self._scheduler = None
+
+    def start(self):
+        self._scheduler = SnapshotScheduler(
+            self.fleet, self._on_snapshot, 1.0 / self.interval, names=self.names
+        ).start()
+        return self
+
+    def stop(self, timeout=None):
+        if self._scheduler is not None:
+            self._scheduler.stop(timeout)
+        if self._own_executor:
+            self._executor.shutdown(wait=True)
+        with self._lock:
+            self._stopped = True
+            writers, self._writers = self._writers, {}
+            idle = [writer for _, writer in writers.values() if self._retire(writer)]
+        for writer in idle:
+            writer.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _on_snapshot(self, name, rc, data, timestamp):
+        if rc != FOSCAM_SUCCESS or not data:
+            return
+        with self._lock:
+            if self._stopped:
+                return
+            if self._pending >= self.max_pending:
+                self.dropped += 1
+                return
+            self._pending += 1
+        try:
+            self._executor.submit(self._add, name, data, timestamp)
+        except RuntimeError:
+            with self._lock:
+                self._pending -= 1
+
+    def _retire(self, writer):
+        """
+        Return whether writer can be closed now, or have the last worker
+        using it close it. Call with the lock held.
+        """
+        if self._users.get(writer):
+            self._retired.add(writer)
+            return False
+        self._users.pop(writer, None)
+        return True
+
+    def _writer(self, name, timestamp):
+        """
+        Return the writer of camera name for the day of timestamp, to
+        release after use, or None once stopped.
+        """
+        day = strftime("%Y-%m-%d", localtime(timestamp))
+        idle = False
+        with self._lock:
+            if self._stopped:
+                return None
+            current = self._writers.get(name)
+            if current is not None and current[0] == day:
+                writer = current[1]
+            else:
+                directory = os.path.join(self.directory, name)
+                os.makedirs(directory, exist_ok=True)
+                writer = TimelapseWriter(os.path.join(directory, f"{day}.mjpeg"))
+                self._writers[name] = day, writer
+                idle = current is not None and self._retire(current[1])
+            self._users[writer] = self._users.get(writer, 0) + 1
+        if idle:
+            current[1].close()
+        return writer
+
+    def _release(self, writer):
+        with self._lock:
+            self._users[writer] -= 1
+            if self._users[writer] or writer not in self._retired:
+                return
+            del self._users[writer]
+            self._retired.remove(writer)
+        writer.close()
+
+    def _add(self, name, data, timestamp):
+        try:
+            try:
+                frame = downsample(data, self.size, self.quality)
+            except (OSError, SyntaxError):
+                # Pillow could not decode the snapshot.
+                with self._lock:
+                    self.failed += 1
+                return
+            writer = self._writer(name, timestamp)
+            if writer is None:
+                with self._lock:
+                    self.dropped += 1
+                return
+            try:
+                writer.append(frame, timestamp)
+            finally:
+                self._release(writer)
+            with self._lock:
+                self.frames += 1
+        finally:
+            with self._lock:
+                self._pending -= 1
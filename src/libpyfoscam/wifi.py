@@ -0,0 +1,147 @@
+"""
+Decoding and aggregation of Wi-Fi scan results
+"""
+
+from array import array
+
+
+class WifiAP(object):
+    """
+    An access point seen by the camera: its SSID, MAC address, signal
+    quality (0 to 100), whether it is encrypted and the encryption type:
+    0 (open), 1 (WEP), 2 (WPA), 3 (WPA2) or 4 (WPA/WPA2).
+    """
+
+    __slots__ = ("ssid", "mac", "quality", "encrypted", "encrypt_type")
+
+    def __init__(self, ssid, mac, quality, encrypted, encrypt_type):
+        self.ssid = ssid
+        self.mac = mac
+        self.quality = quality
+        self.encrypted = encrypted
+        self.encrypt_type = encrypt_type
+
+    @classmethod
+    def parse(cls, text):
+        """
+        Decode a getWifiList AP "SSID+MAC+quality+isEncrypted+encrypType".
+        The SSID may itself contain "+".
+        """
+        ssid, mac, quality, encrypted, encrypt_type = text.rsplit("+", 4)
+        return cls(ssid, mac, int(quality), encrypted == "1", int(encrypt_type))
+
+    def __eq__(self, other):
+        if not isinstance(other, WifiAP):
+            return NotImplemented
+        return all(
+            getattr(self, name) == getattr(other, name) for name in self.__slots__
+        )
+
+    def __repr__(self):
+        return (
+            f"WifiAP(ssid={self.ssid!r}, mac={self.mac!r}, quality={self.quality}, "
+            f"encrypted={self.encrypted}, encrypt_type={self.encrypt_type})"
+        )
+
+
+def decode_wifi_page(params):
+    """
+    Return the WifiAPs of a getWifiList page.
+    """
+    aps = []
+    for i in range(int(params.get("curCnt") or 0)):
+        text = params.get(f"ap{i}")
+        if text:
+            aps.append(WifiAP.parse(text))
+    return aps
+
+
+class WifiSurvey(object):
+    """
+    The APs seen by many cameras, indexed by BSSID (the AP MAC address).
+
+    Each sighting of an AP by a camera is a row of compact array columns:
+    camera index, BSSID index, quality and encryption type. The strongest
+    AP of each camera is kept as it is added. Cameras whose scan failed
+    are in errors, with the exception raised.
+    """
+
+    def __init__(self):
+        self.camera_names = []
+        self.bssids = []
+        self.ssids = []
+        self.cameras = array("H")
+        self.aps = array("I")
+        self.qualities = array("B")
+        self.encrypt_types = array("B")
+        self.errors = {}
+        self._camera_ids = {}
+        self._bssid_ids = {}
+        self._sightings = []
+        self._strongest = []
+
+    def __len__(self):
+        return len(self.aps)
+
+    def add(self, camera, aps):
+        """
+        Add the WifiAPs seen by camera, a name, in one scan.
+        Raises ValueError if the camera was already added.
+        """
+        if camera in self._camera_ids:
+            raise ValueError(f"Camera {camera} already surveyed")
+        camera_id = self._camera_ids[camera] = len(self.camera_names)
+        self.camera_names.append(camera)
+        strongest = -1
+        for ap in aps:
+            bssid_id = self._bssid_ids.get(ap.mac)
+            if bssid_id is None:
+                bssid_id = self._bssid_ids[ap.mac] = len(self.bssids)
+                self.bssids.append(ap.mac)
+                self.ssids.append(ap.ssid)
+                self._sightings.append(array("I"))
+            row = len(self.aps)
+            self.cameras.append(camera_id)
+            self.aps.append(bssid_id)
+            self.qualities.append(ap.quality)
+            self.encrypt_types.append(ap.encrypt_type)
+            self._sightings[bssid_id].append(row)
+            if strongest < 0 or ap.quality > self.qualities[strongest]:
+                strongest = row
+        self._strongest.append(strongest)
+
+    def _ap(self, row):
+        bssid_id = self.aps[row]
+        return self.bssids[bssid_id], self.ssids[bssid_id], self.qualities[row]
+
+    def strongest(self, camera):
+        """
+        Return (bssid, ssid, quality) of the strongest AP seen by camera,
+        or None if it saw none.
+        """
+        row = self._strongest[self._camera_ids[camera]]
+        return self._ap(row) if row >= 0 else None
+
+    def strongest_all(self):
+        """
+        Return a dict of camera names to their strongest AP, as strongest.
+        """
+        return {
+            camera: self._ap(row) if row >= 0 else None
+            for camera, row in zip(self.camera_names, self._strongest)
+        }
+
+    def seen_by(self, bssid):
+        """
+        Return (camera, quality) of the cameras seeing the AP bssid,
+        strongest first.
+        """
+        bssid_id = self._bssid_ids.get(bssid)
+        if bssid_id is None:
+            return []
+        sightings = [
+            (self.camera_names[self.cameras[row]], self.qualities[row])
+            for row in self._sightings[bssid_id]
+        ]
+        sightings.sort(key=lambda sighting: sighting[1], reverse=True)
+        return sightings
@@ -0,0 +1,95 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from libpyfoscam.archive import SnapshotArchive
+
+
+def frame(name, i):
+    return f'{name} frame {i} '.encode() * 10
+
+
+def read(archive, name, start=None, end=None):
+    return [(t, bytes(view)) for t, view in archive.frames(name, start, end)]
+
+
+class TestSnapshotArchive(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.directory = tmp.name
+
+    def fill(self, archive, count=20):
+        for i in range(count):
+            for name in ('front', 'back'):
+                archive.append(name, frame(name, i), 100.0 + i)
+
+    def segments(self, extension):
+        return sorted(f for f in os.listdir(self.directory) if f.endswith(extension))
+
+    def test_append_and_ranges(self):
+        archive = SnapshotArchive(self.directory, segment_size=1000)
+        self.fill(archive)
+        archive.append('front', frame('late', 0), 105.5)
+        self.assertEqual(sorted(archive.cameras()), ['back', 'front'])
+        self.assertEqual(len(archive.times('front')), 21)
+        self.assertEqual(list(archive.times('back')), [100.0 + i for i in range(20)])
+        frames = read(archive, 'front', 105, 107)
+        self.assertEqual([t for t, _ in frames], [105.0, 105.5, 106.0, 107.0])
+        self.assertEqual(frames[1][1], frame('late', 0))
+        self.assertEqual(frames[2][1], frame('front', 6))
+        self.assertEqual(read(archive, 'front', 200), [])
+        self.assertEqual(read(archive, 'side'), [])
+        archive.close()
+
+    def test_reopen_reads_indexes(self):
+        archive = SnapshotArchive(self.directory, segment_size=1000)
+        self.fill(archive)
+        expected = {name: read(archive, name) for name in ('front', 'back')}
+        archive.close()
+        segments = self.segments('.dat')
+        self.assertGreater(len(segments), 2)
+        self.assertEqual(len(self.segments('.idx')), len(segments) - 1)
+        with mock.patch.object(
+            SnapshotArchive, '_load', autospec=True, side_effect=SnapshotArchive._load
+        ) as load:
+            archive = SnapshotArchive(self.directory, segment_size=1000)
+        self.assertEqual(load.call_count, 1)
+        for name, frames in expected.items():
+            self.assertEqual(read(archive, name), frames)
+        archive.close()
+
+    def test_missing_index_is_rebuilt(self):
+        archive = SnapshotArchive(self.directory, segment_size=1000)
+        self.fill(archive)
+        expected = read(archive, 'back')
+        archive.close()
+        index = os.path.join(self.directory, self.segments('.idx')[0])
+        os.remove(index)
+        archive = SnapshotArchive(self.directory, segment_size=1000)
+        self.assertEqual(read(archive, 'back'), expected)
+        self.assertTrue(os.path.exists(index))
+        archive.close()
+
+    def test_crash_truncation(self):
+        archive = SnapshotArchive(self.directory, segment_size=1000)
+        self.fill(archive, 3)
+        archive.close()
+        path = os.path.join(self.directory, self.segments('.dat')[-1])
+        size = os.path.getsize(path)
+        with open(path, 'ab') as f:
+            f.write(b'FSNP\x05\x00\xff')
+        archive = SnapshotArchive(self.directory, segment_size=1000)
+        self.assertEqual(os.path.getsize(path), size)
+        self.assertEqual(len(archive.times('front')), 3)
+        archive.append('front', frame('front', 3), 103.0)
+        self.assertEqual(read(archive, 'front', 103)[0][1], frame('front', 3))
+        archive.close()
+        archive = SnapshotArchive(self.directory, segment_size=1000)
+        self.assertEqual(len(archive.times('front')), 4)
+        archive.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import unittest
+from unittest import mock
+
+from libpyfoscam.cache import ResponseCache, invalidated_reads
+
+OK = {'isEnable': '1'}
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('libpyfoscam.cache.monotonic', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cache = ResponseCache(max_entries=3, default_ttl=60)
+
+    def put(self, cmd, params=None, camera='cam', code=0):
+        generation = self.cache.generation(camera)
+        self.cache.update(camera, cmd, params, code, OK, generation)
+
+    def test_ttl_expiry(self):
+        self.put('getMotionDetectConfig')
+        self.put('getDevState')
+        self.now += 1
+        self.assertIsNone(self.cache.get('cam', 'getDevState'))
+        self.assertEqual(self.cache.get('cam', 'getMotionDetectConfig'), (0, OK))
+        self.now += 59
+        self.assertIsNone(self.cache.get('cam', 'getMotionDetectConfig'))
+
+    def test_not_cached(self):
+        self.put('getLog', {'offset': 0})
+        self.put('getIPInfo', code=-2)
+        self.assertIsNone(self.cache.get('cam', 'getLog', {'offset': 0}))
+        self.assertIsNone(self.cache.get('cam', 'getIPInfo'))
+
+    def test_params_are_part_of_key(self):
+        self.put('getRecordList', {'a': 1, 'b': 2})
+        response = self.cache.get('cam', 'getRecordList', {'b': 2, 'a': 1})
+        self.assertEqual(response, (0, OK))
+        self.assertIsNone(self.cache.get('cam', 'getRecordList', {'a': 2, 'b': 2}))
+        self.assertIsNone(self.cache.get('other', 'getRecordList', {'a': 1, 'b': 2}))
+
+    def test_lru_eviction(self):
+        for cmd in ('getA', 'getB', 'getC'):
+            self.put(cmd)
+        self.cache.get('cam', 'getA')
+        self.put('getD')
+        self.assertIsNone(self.cache.get('cam', 'getB'))
+        for cmd in ('getA', 'getC', 'getD'):
+            self.assertIsNotNone(self.cache.get('cam', cmd), cmd)
+
+    def test_set_invalidates_get(self):
+        self.put('getIPInfo')
+        self.put('getIPInfo', camera='other')
+        self.put('getDevInfo')
+        self.put('setIpInfo')
+        self.assertIsNone(self.cache.get('cam', 'getIPInfo'))
+        self.assertIsNone(self.cache.get('cam', 'getDevInfo'))
+        self.assertIsNotNone(self.cache.get('other', 'getIPInfo'))
+
+    def test_command_invalidates(self):
+        self.put('getMotionDetectConfig')
+        self.put('getDevState', {'x': 1})
+        self.put('getDevInfo')
+        self.put('setMotionDetectConfig')
+        self.assertIsNone(self.cache.get('cam', 'getMotionDetectConfig'))
+        self.assertIsNone(self.cache.get('cam', 'getDevState', {'x': 1}))
+        self.assertIsNotNone(self.cache.get('cam', 'getDevInfo'))
+        self.put('mirrorVideo')
+        self.put('getMirrorAndFlipSetting')
+        self.put('flipVideo')
+        self.assertIsNone(self.cache.get('cam', 'getMirrorAndFlipSetting'))
+
+    def test_invalidated_reads(self):
+        self.assertEqual(invalidated_reads('setOSDSetting'), {'getosdsetting'})
+        self.assertEqual(
+            invalidated_reads('openInfraLed'), {'getinfraledconfig', 'getdevstate'}
+        )
+        self.assertIsNone(invalidated_reads('changePassword'))
+        self.assertEqual(invalidated_reads('snapPicture2'), set())
+
+    def test_generation_guard(self):
+        generation = self.cache.generation('cam')
+        self.put('setMotionDetectConfig')
+        self.cache.update('cam', 'getMotionDetectConfig', None, 0, OK, generation)
+        self.assertIsNone(self.cache.get('cam', 'getMotionDetectConfig'))
+        # A command invalidating nothing leaves reads in flight alone.
+        generation = self.cache.generation('cam')
+        self.put('snapPicture2')
+        self.cache.update('cam', 'getMotionDetectConfig', None, 0, OK, generation)
+        self.assertIsNotNone(self.cache.get('cam', 'getMotionDetectConfig'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,161 @@
+import threading
+import time
+import unittest
+from unittest import mock
+
+from libpyfoscam.dispatch import CameraDispatcher, SingleFlight
+from libpyfoscam.executor import CommandExecutor
+from libpyfoscam.foscam import FoscamCamera
+
+
+class TestSingleFlight(unittest.TestCase):
+    def test_followers_share_the_leader_future(self):
+        flight = SingleFlight()
+        future, leader = flight.join('key')
+        shared, follower = flight.join('key')
+        self.assertTrue(leader)
+        self.assertFalse(follower)
+        self.assertIs(shared, future)
+        flight.finish('key', future, (0, {}))
+        self.assertEqual(shared.result(), (0, {}))
+        self.assertTrue(flight.join('key')[1])
+
+    def test_abandon_without_followers_cancels(self):
+        flight = SingleFlight()
+        future, _ = flight.join('key')
+        self.assertFalse(flight.abandon('key', future))
+        self.assertTrue(future.cancelled())
+        self.assertTrue(flight.join('key')[1])
+
+    def test_abandon_with_followers_keeps_the_call(self):
+        flight = SingleFlight()
+        future, _ = flight.join('key')
+        flight.join('key')
+        self.assertTrue(flight.abandon('key', future))
+        self.assertFalse(future.done())
+        self.assertFalse(flight.join('key')[1])
+
+
+class TestCameraDispatcher(unittest.TestCase):
+    def setUp(self):
+        self.executor = CommandExecutor(max_workers=4)
+        self.addCleanup(self.executor.shutdown)
+        self.camera = FoscamCamera(
+            '127.0.0.1',
+            88,
+            'admin',
+            'secret',
+            daemon=True,
+            executor=self.executor,
+            max_concurrent=1,
+        )
+        self.sent = []
+        self.release = threading.Event()
+        patcher = mock.patch.object(self.camera, 'send_command', self.send_command)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def send_command(self, cmd, params=None, raw=False, into=None):
+        self.sent.append(cmd)
+        if len(self.sent) == 1:
+            self.release.wait(5)
+        return 0, {}
+
+    def test_ptz_stop_goes_first(self):
+        first = self.camera.get_log(0)
+        futures = [
+            self.camera.get_log(10),
+            self.camera.get_product_all_info(),
+            self.camera.get_dev_state(),
+            self.camera.ptz_stop_run(),
+        ]
+        self.release.set()
+        first.result(5)
+        for future in futures:
+            future.result(5)
+        self.assertEqual(
+            self.sent,
+            ['getLog', 'ptzStopRun', 'getDevState', 'getLog', 'getProductAllInfo'],
+        )
+
+    def test_busy_holds_commands(self):
+        self.release.set()
+        self.camera.refresh_wifi_list().result(5)
+        self.assertTrue(self.camera.dispatcher.busy)
+        future = self.camera.get_dev_state()
+        time.sleep(0.2)
+        self.assertFalse(future.done())
+        self.assertEqual(self.sent, ['refreshWifiList'])
+        self.camera.dispatcher.clear_busy()
+        self.assertEqual(future.result(5)[0], 0)
+        self.assertEqual(self.sent, ['refreshWifiList', 'getDevState'])
+
+    def test_max_concurrent(self):
+        dispatcher = CameraDispatcher(max_concurrent=2)
+        started = []
+        for cmd in ('getA', 'getB', 'getC'):
+            dispatcher.enqueue(cmd, lambda cmd=cmd: started.append(cmd))
+        self.assertEqual(started, ['getA', 'getB'])
+        dispatcher.release('getA')
+        self.assertEqual(started, ['getA', 'getB', 'getC'])
+
+
+class TestReadCoalescing(unittest.TestCase):
+    def setUp(self):
+        self.camera = FoscamCamera('127.0.0.1', 88, 'admin', 'secret')
+        self.config = {'isEnable': '0'}
+        self.sent = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+        patcher = mock.patch.object(self.camera, 'send_command', self.send_command)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def send_command(self, cmd, params=None, raw=False, into=None):
+        self.sent.append(cmd)
+        if cmd.startswith('get'):
+            config = dict(self.config)
+            if len(self.sent) == 1:
+                self.started.set()
+                self.release.wait(5)
+            return 0, config
+        self.config = dict(params)
+        return 0, {}
+
+    def read_in_thread(self, results):
+        def read():
+            results.append(self.camera.execute_command('getMotionDetectConfig'))
+
+        thread = threading.Thread(target=read)
+        thread.start()
+        return thread
+
+    def test_reads_in_flight_are_shared(self):
+        results = []
+        first = self.read_in_thread(results)
+        self.started.wait(5)
+        second = self.read_in_thread(results)
+        calls = self.camera._single_flight._calls
+        while not any(followers for _, followers in calls.values()):
+            second.join(0.001)
+        self.release.set()
+        first.join()
+        second.join()
+        self.assertEqual(self.sent, ['getMotionDetectConfig'])
+        self.assertEqual(len(results), 2)
+
+    def test_read_after_write_is_sent(self):
+        results = []
+        first = self.read_in_thread(results)
+        self.started.wait(5)
+        self.camera.execute_command('setMotionDetectConfig', {'isEnable': '1'})
+        second = self.read_in_thread(results)
+        second.join()
+        self.release.set()
+        first.join()
+        self.assertEqual(self.sent.count('getMotionDetectConfig'), 2)
+        self.assertEqual(results[0], (0, {'isEnable': '1'}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import queue
+import threading
+import time
+import unittest
+
+from libpyfoscam.dispatch import PRIORITY_HIGH, PRIORITY_LOW
+from libpyfoscam.executor import CommandExecutor
+from libpyfoscam.foscam import FoscamCamera
+
+
+class TestCommandExecutor(unittest.TestCase):
+    def setUp(self):
+        self.executor = CommandExecutor(max_workers=1, max_queue=2)
+        self.release = threading.Event()
+        self.addCleanup(self.executor.shutdown)
+        self.addCleanup(self.release.set)
+        self.executor.submit(self.release.wait, 5)
+        while self.executor.queue_depth:
+            time.sleep(0.001)
+
+    def test_queue_full_after_timeout(self):
+        futures = [self.executor.submit(len, 'ab') for _ in range(2)]
+        self.assertEqual(self.executor.queue_depth, 2)
+        started = time.monotonic()
+        self.assertRaises(queue.Full, self.executor.submit, len, 'ab', timeout=0.1)
+        self.assertGreaterEqual(time.monotonic() - started, 0.1)
+        # High priority commands never wait for room.
+        high = self.executor.submit(len, 'abc', priority=PRIORITY_HIGH)
+        self.release.set()
+        self.assertEqual(high.result(5), 3)
+        self.assertEqual([future.result(5) for future in futures], [2, 2])
+
+    def test_priority_order(self):
+        started = []
+        futures = [
+            self.executor.submit(started.append, 'getLog', priority=PRIORITY_LOW),
+            self.executor.submit(started.append, 'getDevState'),
+            self.executor.submit(started.append, 'ptzStopRun', priority=PRIORITY_HIGH),
+        ]
+        self.release.set()
+        for future in futures:
+            future.result(5)
+        self.assertEqual(started, ['ptzStopRun', 'getDevState', 'getLog'])
+
+    def test_camera_queue_timeout(self):
+        camera = FoscamCamera(
+            '127.0.0.1',
+            88,
+            'admin',
+            'secret',
+            daemon=True,
+            executor=self.executor,
+            queue_timeout=0.1,
+            coalesce_reads=False,
+        )
+        camera.send_command = lambda *args: (0, {})
+        futures = [camera.get_dev_state() for _ in range(2)]
+        self.assertRaises(queue.Full, camera.get_dev_state)
+        self.release.set()
+        self.assertEqual([future.result(5)[0] for future in futures], [0, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
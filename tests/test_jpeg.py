@@ -0,0 +1,63 @@
+import unittest
+from array import array
+from struct import pack
+
+from libpyfoscam.jpeg import scan_jpeg
+
+SOI = b'\xff\xd8'
+APP0 = b'\xff\xe0' + pack('>H', 16) + b'JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00'
+SOF0 = b'\xff\xc0' + pack('>HBHHB', 11, 8, 240, 320, 1) + b'\x01\x11\x00'
+SOS = b'\xff\xda' + pack('>H', 8) + b'\x01\x01\x00\x00\x3f\x00'
+SCAN = b'\x12\x34\xff\x00\x56\xff\xd0\x78'
+EOI = b'\xff\xd9'
+JPEG = SOI + APP0 + SOF0 + SOS + SCAN + EOI
+
+
+class TestScanJPEG(unittest.TestCase):
+    def assertInfo(self, info, width, height, soi, eoi, length):
+        self.assertEqual(
+            (info.width, info.height, info.soi, info.eoi, info.length),
+            (width, height, soi, eoi, length),
+        )
+
+    def test_valid(self):
+        info = scan_jpeg(JPEG)
+        self.assertInfo(info, 320, 240, True, True, len(JPEG))
+        self.assertTrue(info.valid)
+
+    def test_truncated(self):
+        info = scan_jpeg(JPEG[:-2])
+        self.assertInfo(info, 320, 240, True, False, len(JPEG) - 2)
+        self.assertFalse(info.valid)
+        info = scan_jpeg(JPEG[: len(SOI + APP0) + 6])
+        self.assertInfo(info, 0, 0, True, False, len(SOI + APP0) + 6)
+        self.assertFalse(info.valid)
+
+    def test_padded_after_eoi(self):
+        info = scan_jpeg(JPEG + b'\x00' * 16)
+        self.assertTrue(info.valid)
+        self.assertEqual(info.length, len(JPEG))
+
+    def test_fill_bytes(self):
+        data = SOI + APP0 + b'\xff\xff' + SOF0 + SOS + SCAN + EOI
+        info = scan_jpeg(data)
+        self.assertInfo(info, 320, 240, True, True, len(data))
+
+    def test_not_jpeg(self):
+        page = b'<CGI_Result>\n<result>-1</result>\n</CGI_Result>\n'
+        self.assertInfo(scan_jpeg(page), 0, 0, False, False, len(page))
+        self.assertFalse(scan_jpeg(b'').valid)
+        self.assertFalse(scan_jpeg(SOI + b'<html>').valid)
+
+    def test_memoryview(self):
+        buffer = bytearray(JPEG + bytes(8))
+        info = scan_jpeg(memoryview(buffer)[: len(JPEG)])
+        self.assertInfo(info, 320, 240, True, True, len(JPEG))
+        # A buffer of another item size is read as bytes.
+        words = array('H', JPEG + bytes(len(JPEG) % 2))
+        info = scan_jpeg(memoryview(words))
+        self.assertInfo(info, 320, 240, True, True, len(JPEG))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from libpyfoscam.foscam import FoscamCamera
+from libpyfoscam.log import LogRecord, LogTailer, decode_log_page
+
+
+def entry(i):
+    return f'{1600000000 + i}+admin+192.168.1.{i % 250}+4'
+
+
+class TestLogRecord(unittest.TestCase):
+    def test_decode_page(self):
+        params = {'curCnt': '3', 'log0': entry(0), 'log1': '', 'log2': entry(2)}
+        records = decode_log_page(params, 20)
+        self.assertEqual([r.offset for r in records], [20, 22])
+        offset, time, user, ip, kind = records[1]
+        self.assertEqual((offset, time, user, kind), (22, 1600000002, 'admin', 4))
+        self.assertEqual(records[1].ip_address, '192.168.1.2')
+        record = LogRecord.parse(0, '1600000000+a+b++5')
+        self.assertEqual((record.user, record.ip, record.type), ('a+b', 0, 5))
+
+
+class TestLogTailer(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, 'cursors.json')
+        self.camera = FoscamCamera('127.0.0.1', 88, 'admin', 'secret')
+        self.log = [entry(i) for i in range(25)]
+        self.next = 25
+        self.reads = []
+        self.lock = threading.Lock()
+        patcher = mock.patch.object(self.camera, 'send_command', self.send_command)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def send_command(self, cmd, params=None, raw=False, into=None):
+        offset, count = params['offset'], params['count']
+        with self.lock:
+            self.reads.append(offset)
+            page = self.log[offset : offset + count]
+            result = {'totalCnt': str(len(self.log)), 'curCnt': str(len(page))}
+        for i, text in enumerate(page):
+            result[f'log{i}'] = text
+        return 0, result
+
+    def add(self, count, drop=0):
+        """
+        Append count records to the log, dropping the drop oldest ones.
+        """
+        self.log.extend(entry(i) for i in range(self.next, self.next + count))
+        del self.log[:drop]
+        self.next += count
+
+    def times(self, records):
+        return [record.time - 1600000000 for record in records]
+
+    def poll(self, tailer):
+        self.reads = []
+        return self.times(tailer.poll('front', self.camera))
+
+    def test_append(self):
+        tailer = LogTailer(self.path)
+        self.assertEqual(self.poll(tailer), list(range(25)))
+        self.assertEqual(self.poll(tailer), [])
+        self.add(3)
+        self.assertEqual(self.poll(tailer), [25, 26, 27])
+        self.assertEqual(min(self.reads), 24)
+        self.assertEqual(tailer.resets, {})
+        # The cursors persist across tailers.
+        self.add(1)
+        self.assertEqual(self.poll(LogTailer(self.path)), [28])
+
+    def test_shift_within_page(self):
+        tailer = LogTailer(self.path)
+        self.poll(tailer)
+        self.add(3, drop=3)
+        self.assertEqual(self.poll(tailer), [25, 26, 27])
+        self.assertNotIn(0, self.reads)
+        self.assertEqual(tailer.resets, {})
+
+    def test_shift_across_pages(self):
+        tailer = LogTailer(self.path)
+        self.poll(tailer)
+        self.add(15, drop=15)
+        self.assertEqual(self.poll(tailer), list(range(25, 40)))
+        self.assertEqual(tailer.resets, {})
+
+    def test_shrink(self):
+        tailer = LogTailer(self.path)
+        self.poll(tailer)
+        self.add(2, drop=5)
+        self.assertEqual(self.poll(tailer), [25, 26])
+        self.assertEqual(tailer.resets, {})
+
+    def test_record_gone(self):
+        tailer = LogTailer(self.path)
+        self.poll(tailer)
+        self.add(40, drop=40)
+        self.assertEqual(self.poll(tailer), list(range(40, 65)))
+        self.assertEqual(tailer.resets, {'front': 1})
+
+    def test_clear(self):
+        tailer = LogTailer(self.path)
+        self.poll(tailer)
+        self.add(4, drop=25)
+        self.assertEqual(self.poll(tailer), [25, 26, 27, 28])
+        self.assertEqual(tailer.resets, {'front': 1})
+        self.add(1)
+        self.assertEqual(self.poll(tailer), [29])
+
+
+if __name__ == '__main__':
+    unittest.main()
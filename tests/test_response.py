@@ -0,0 +1,52 @@
+import unittest
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+from urllib.parse import unquote
+
+from libpyfoscam.response import CGIResultParser, parse_cgi_result
+
+BODIES = [
+    b'<CGI_Result>\n<result>0</result>\n<devName>Front &amp; back</devName>\n'
+    b'<ssid>&quot;home&quot; &#39;5G&#39; &#x41;&#66; &lt;1&gt;</ssid>\n'
+    b'<log0>1600000000%2Badmin%2B192.168.1.2%2B4</log0>\n<empty></empty>\n'
+    b'<alias>caf\xc3\xa9 %C3%A9 &#233;</alias>\n</CGI_Result>\n',
+    b'<?xml version="1.0"?>\n<CGI_Result>\n<result>-2</result>\n</CGI_Result>',
+]
+
+
+def parse_element_tree(data):
+    root = ET.fromstring(data)
+    code = None
+    params = OrderedDict()
+    for child in root.iter():
+        if child.tag == 'result':
+            code = int(child.text)
+        elif child.tag != 'CGI_Result':
+            params[child.tag] = unquote(child.text) if child.text is not None else None
+    return code, params
+
+
+class TestCGIResultParser(unittest.TestCase):
+    def test_matches_element_tree(self):
+        for body in BODIES:
+            self.assertEqual(parse_cgi_result(body), parse_element_tree(body))
+
+    def test_every_chunk_split(self):
+        for body in BODIES:
+            expected = parse_element_tree(body)
+            for split in range(len(body) + 1):
+                parser = CGIResultParser()
+                parser.feed(body[:split])
+                parser.feed(body[split:])
+                self.assertEqual(parser.close(), expected, split)
+            parser = CGIResultParser()
+            for i in range(len(body)):
+                parser.feed(body[i : i + 1])
+            self.assertEqual(parser.close(), expected)
+
+    def test_not_a_result(self):
+        self.assertRaises(ValueError, parse_cgi_result, b'<html>404</html>')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,26 @@
+import unittest
+
+from libpyfoscam.results import DevState, typed_result
+
+
+class TestCGIResult(unittest.TestCase):
+    def test_only_sent_fields_are_keys(self):
+        params = {'sdState': '1', 'IOState': '0', 'streamState': '2'}
+        state = typed_result('getDevState', params)
+        self.assertIsInstance(state, DevState)
+        self.assertEqual(len(state), 3)
+        self.assertNotIn('ntpState', state)
+        self.assertIsNone(state.ntpState)
+        self.assertRaises(KeyError, state.__getitem__, 'ntpState')
+        self.assertEqual(dict(state.as_dict()), params)
+
+    def test_as_dict_round_trip(self):
+        params = {'isEnable': '1', 'linkage': '0', 'area0': '1023', 'x': ''}
+        config = typed_result('getMotionDetectConfig', params)
+        self.assertEqual(config.isEnable, 1)
+        self.assertEqual(dict(config.as_dict()), params)
+        self.assertNotIn(None, config.as_dict().values())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from libpyfoscam.scheduler import SnapshotScheduler
+
+
+class StubCamera(object):
+    def __init__(self):
+        self.count = 0
+
+    def snap_picture_2(self):
+        self.count += 1
+        return 0, self.count
+
+
+class StubFleet(object):
+    def __init__(self, cameras):
+        self.cameras = cameras
+        self.executor = ThreadPoolExecutor(8)
+
+    def select(self, names=None):
+        return list(self.cameras.items())
+
+
+class TestSnapshotScheduler(unittest.TestCase):
+    def test_slow_handler_skips_slots(self):
+        fleet = StubFleet({'front': StubCamera()})
+        self.addCleanup(fleet.executor.shutdown)
+        lock = threading.Lock()
+        running = []
+        frames = []
+        peak = [0]
+
+        def handler(name, rc, data, timestamp):
+            with lock:
+                running.append(data)
+                peak[0] = max(peak[0], len(running))
+            time.sleep(0.2)
+            with lock:
+                running.remove(data)
+                frames.append(data)
+
+        scheduler = SnapshotScheduler(fleet, handler, fps=20, jitter=0)
+        scheduler.start()
+        time.sleep(1)
+        scheduler.stop()
+        fleet.executor.shutdown(wait=True)
+        self.assertEqual(peak[0], 1)
+        self.assertEqual(frames, sorted(frames))
+        stats = scheduler.stats()['front']
+        self.assertLessEqual(stats['captured'], 6)
+        self.assertGreater(stats['skipped'], 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
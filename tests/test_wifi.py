@@ -0,0 +1,45 @@
+import unittest
+from unittest import mock
+
+from libpyfoscam.foscam import FoscamCamera
+from libpyfoscam.wifi import WifiAP, decode_wifi_page
+
+APS = ['net%d+AA:BB:CC:DD:EE:%02X+%d+1+3' % (i, i, 40 + i) for i in range(23)]
+
+
+class TestScanWifi(unittest.TestCase):
+    def setUp(self):
+        self.camera = FoscamCamera('127.0.0.1', 88, 'admin', 'secret')
+        self.starts = []
+        patcher = mock.patch.object(self.camera, 'send_command', self.send_command)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def send_command(self, cmd, params=None, raw=False, into=None):
+        if cmd == 'refreshWifiList':
+            return 0, {}
+        start = params['startNo']
+        self.starts.append(start)
+        page = APS[start : start + 10]
+        result = {'totalCnt': str(len(APS)), 'curCnt': str(len(page))}
+        for i, text in enumerate(page):
+            # The camera sends some records empty.
+            result[f'ap{i}'] = text if start + i != 3 else None
+        return 0, result
+
+    def test_pages_step_by_records(self):
+        aps = self.camera.scan_wifi(delay=0)
+        self.assertEqual(sorted(set(self.starts)), [0, 10, 20])
+        self.assertEqual(len(aps), 22)
+        self.assertEqual(len({ap.mac for ap in aps}), 22)
+        self.assertNotIn('net3', [ap.ssid for ap in aps])
+
+    def test_parse(self):
+        ap = WifiAP.parse('my+net+AA:BB:CC:DD:EE:FF+73+1+4')
+        self.assertEqual(ap, WifiAP('my+net', 'AA:BB:CC:DD:EE:FF', 73, True, 4))
+        params = {'curCnt': '2', 'ap0': APS[0], 'ap1': ''}
+        self.assertEqual([ap.ssid for ap in decode_wifi_page(params)], ['net0'])
+
+
+if __name__ == '__main__':
+    unittest.main()
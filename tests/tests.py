@@ -8,6 +8,7 @@ except ImportError:
     from ConfigParser import SafeConfigParser as ConfigParser
 
 from libpyfoscam.foscam import FoscamCamera, FOSCAM_SUCCESS
+from libpyfoscam.jpeg import scan_jpeg
 
 config = ConfigParser()
 config_filepath = os.path.join(os.path.dirname(__file__), 'camtest.cfg')
@@ -123,6 +124,11 @@ class TestFoscam(unittest.TestCase):
             keyformat=0,
             defaultkey=1)
 
+    def test_scan_wifi(self):
+        aps = self.foscam.scan_wifi()
+        for ap in aps:
+            self.assertTrue(0 <= ap.quality <= 100)
+
     # *************** PTZ Move ********************************
 
     def test_move_up(self):
@@ -208,6 +214,13 @@ class TestFoscam(unittest.TestCase):
         rc, args = self.foscam.get_dev_state()
         self.assertEqual(rc, 0)
 
+    def test_typed_dev_state(self):
+        self.foscam.typed_results = True
+        rc, state = self.foscam.get_dev_state()
+        self.assertEqual(rc, 0)
+        self.assertIsInstance(state.sdState, int)
+        self.assertEqual(state.as_dict()['sdState'], str(state.sdState))
+
     def test_dev_info(self):
         rc, args = self.foscam.get_dev_info()
         self.assertEqual(rc, 0)
@@ -259,6 +272,15 @@ class TestFoscam(unittest.TestCase):
             alarm_record_secs=old_args['alarmRecordSecs'],
             prerecord_secs=old_args['preRecordSecs'])
 
+    def test_set_config_if_changed(self):
+        rc, args = self.foscam.get_motion_detect_config()
+        self.assertEqual(rc, FOSCAM_SUCCESS)
+        rc, changed = self.foscam.set_config_if_changed(
+            'getMotionDetectConfig', 'setMotionDetectConfig',
+            {'isEnable': args['isEnable']})
+        self.assertEqual(rc, FOSCAM_SUCCESS)
+        self.assertFalse(changed)
+
     def test_get_local_alarm_record_config(self):
         rc, args = self.foscam.get_local_alarm_record_config()
         self.assertTrue(set(args) == {'isEnableLocalAlarmRecord',
@@ -324,6 +346,13 @@ class TestFoscam(unittest.TestCase):
         sleep(0.5)
         self.foscam.ptz_stop_run()
 
+    def test_unblocked_future(self):
+        self.foscam.daemon = True
+        future = self.foscam.get_ip_info()
+        rc, args = future.result(timeout=10)
+        self.assertEqual(rc, FOSCAM_SUCCESS)
+        self.assertTrue('ip' in args)
+
     def test_callback(self):
         def print_res(*args, **kwargs):
             with open('tmp.txt', 'w') as f:
@@ -358,6 +387,31 @@ class TestFoscam(unittest.TestCase):
             fp.write(data)
         self.assertSequenceEqual(callback.args, (rc, data))
 
+    def test_snap_picture_into(self):
+        buffer = bytearray(1024 * 1024)
+        rc, size = self.foscam.snap_picture_into(buffer)
+        self.assertEqual(rc, FOSCAM_SUCCESS)
+        self.assertEqual(buffer[:2], b'\xff\xd8')
+        self.assertEqual(buffer[size - 2:size], b'\xff\xd9')
+
+    def test_scan_snapshot(self):
+        rc, data = self.foscam.snap_picture_2()
+        self.assertEqual(rc, FOSCAM_SUCCESS)
+        info = scan_jpeg(data)
+        self.assertTrue(info.valid)
+        self.assertEqual(info.length, len(data))
+        self.assertFalse(scan_jpeg(data[:len(data) // 2]).valid)
+
+    def test_mjpeg_stream(self):
+        self.foscam.set_sub_stream_format(1)
+        reader = self.foscam.open_mjpeg_stream()
+        try:
+            sleep(2)
+            sequence, stamp, frame = reader.ring.latest()
+        finally:
+            reader.stop()
+        self.assertEqual(frame[:2], b'\xff\xd8')
+
     # ********************** Misc ****************************
 
     def test_get_log(self):
@@ -368,6 +422,13 @@ class TestFoscam(unittest.TestCase):
         self.assertTrue('log0' in args)
         self.assertSequenceEqual(callback.args, (rc, args))
 
+    def test_iter_log(self):
+        records = list(self.foscam.iter_log())
+        offsets = [record[0] for record in records]
+        self.assertEqual(offsets, list(range(len(records))))
+        if records:
+            self.assertEqual(list(self.foscam.iter_log(since=len(records))), [])
+
 
 if __name__ == '__main__':
     unittest.main()